@@ -0,0 +1,329 @@
+"""Замеры производительности модуля фитнес-трекера.
+
+Пример запуска::
+
+    python benchmark.py --sizes 1e3 1e5 --output results.json
+    python benchmark.py --baseline results.json
+    python benchmark.py --memory --sizes 1e4
+
+Проверка на замедление относительно сохранённой в репозитории базы::
+
+    python benchmark.py --sizes 1e4 --repeat 10 \\
+        --baseline benchmark_baseline.json --tolerance 0.5
+
+Каждый этап обработки пакета замеряется отдельно: разбор пакета
+``read_package``, расчёт метрик, создание ``InfoMessage`` и формирование
+текста ``get_message``. Результаты выводятся в JSON и сравниваются
+с сохранённой базой: замедление больше допуска завершает запуск с ошибкой.
+Вместе с замерами сохраняется время эталонного цикла ``calibrate``,
+по нему база пересчитывается на скорость текущей машины. По умолчанию
+с базой сравнивается сумма этапов ``total``: лучший из повторов итог
+заметно устойчивее к шуму, чем отдельные этапы. Число вызовов функций
+на запись (``profile_calls``) от шума не зависит и сравнивается строго,
+эту проверку также выполняют тесты.
+С ``--memory`` вместо времени через ``tracemalloc`` измеряется память
+этапов ``read_package``, ``show_training_info`` и ``get_message``.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from itertools import islice
+from typing import (Any, Callable, Dict, Iterator, List, Optional, Sequence,
+                    Tuple)
+
+import homework
+
+STAGES = ('read_package', 'metrics', 'info_message', 'get_message')
+TOTAL = 'total'
+DEFAULT_SIZES = (1000, 10000, 100000)
+CHUNK_SIZE = 100000
+CALL_SLACK = 0.5
+RECORD_STAGES = ('read_package', 'show_training_info', 'get_message')
+
+
+def generate_packages(workout_type: str, count: int,
+                      seed: int = 0) -> Iterator[Tuple[str, list]]:
+    """Лениво сгенерировать правдоподобные пакеты заданного типа."""
+    homework.get_workout(workout_type)
+    rnd = random.Random(f'{workout_type}:{seed}')
+    for _ in range(count):
+        duration = rnd.uniform(0.25, 3)
+        weight = rnd.uniform(45, 120)
+        if workout_type == 'SWM':
+            yield workout_type, [rnd.randint(200, 3000), duration, weight,
+                                 rnd.choice([25, 50]), rnd.randint(4, 80)]
+        elif workout_type == 'WLK':
+            yield workout_type, [rnd.randint(2000, 30000), duration, weight,
+                                 rnd.uniform(150, 200)]
+        else:
+            yield workout_type, [rnd.randint(2000, 40000), duration, weight]
+
+
+def time_stages(packages: Sequence[Tuple[str, list]]) -> Dict[str, float]:
+    """Замерить время каждого этапа обработки пачки пакетов."""
+    read_package = homework.read_package
+    info_message = homework.InfoMessage
+    timings = {}
+
+    started = time.perf_counter()
+    trainings = [read_package(workout_type, data)
+                 for workout_type, data in packages]
+    timings['read_package'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    metrics = [training.get_metrics() for training in trainings]
+    timings['metrics'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    infos = [info_message(training.__class__.__name__, training.duration,
+                          *values)
+             for training, values in zip(trainings, metrics)]
+    timings['info_message'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    [info.get_message() for info in infos]
+    timings['get_message'] = time.perf_counter() - started
+    return timings
+
+
+def run_benchmark(sizes: Sequence[int] = DEFAULT_SIZES,
+                  workout_types: Sequence[str] = tuple(homework.WORKOUT),
+                  repeat: int = 3, seed: int = 0) -> List[Dict[str, object]]:
+    """Замерить этапы обработки для всех размеров и типов тренировок.
+
+    Пакеты обрабатываются пачками по ``CHUNK_SIZE``, чтобы объём
+    памяти не зависел от размера замера. Из ``repeat`` повторов
+    берётся лучшее время каждого этапа и всех этапов вместе
+    (``TOTAL``).
+    """
+    results = []
+    for workout_type in workout_types:
+        for size in sizes:
+            best = dict.fromkeys(STAGES + (TOTAL,), float('inf'))
+            for _ in range(repeat):
+                totals = dict.fromkeys(STAGES, 0.0)
+                packages = generate_packages(workout_type, size, seed)
+                while True:
+                    chunk = list(islice(packages, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    for stage, seconds in time_stages(chunk).items():
+                        totals[stage] += seconds
+                totals[TOTAL] = sum(totals.values())
+                for stage, seconds in totals.items():
+                    best[stage] = min(best[stage], seconds)
+            for stage in best:
+                results.append({
+                    'workout_type': workout_type,
+                    'size': size,
+                    'stage': stage,
+                    'seconds': best[stage],
+                    'ns_per_record': best[stage] / size * 1e9,
+                })
+    return results
+
+
+def _calibration_loop(count: int) -> None:
+    """Эталонная нагрузка: арифметика, кортежи и форматирование строк."""
+    for value in range(count):
+        distance = value * 0.65 / 1000
+        '{:.3f} {:.3f}'.format(*(distance, distance / 1.5))
+
+
+def calibrate(repeat: int = 20, count: int = 20000) -> float:
+    """Замерить скорость машины эталонным циклом, нс на итерацию."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _calibration_loop(count)
+        best = min(best, time.perf_counter() - started)
+    return best / count * 1e9
+
+
+def _trace_stage(stage: Callable[[], Any], count: int
+                 ) -> Tuple[Any, Dict[str, float]]:
+    """Выполнить этап под ``tracemalloc`` и пересчитать память на запись.
+
+    ``peak_bytes`` - пик памяти во время этапа, ``retained_bytes`` и
+    ``retained_blocks`` - объём и число блоков памяти, которые остаются
+    занятыми результатом этапа.
+    """
+    tracemalloc.clear_traces()
+    tracemalloc.reset_peak()
+    result = stage()
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot()
+    blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+    return result, {
+        'peak_bytes': peak / count,
+        'retained_bytes': current / count,
+        'retained_blocks': blocks / count,
+    }
+
+
+def profile_memory(workout_type: str, count: int = 10000,
+                   seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """Измерить память этапов обработки пакетов одного типа на запись."""
+    packages = list(generate_packages(workout_type, count, seed))
+    read_package = homework.read_package
+    started = tracemalloc.is_tracing()
+    if not started:
+        tracemalloc.start()
+    try:
+        trainings, read_stats = _trace_stage(
+            lambda: [read_package(code, data)
+                     for code, data in packages], count)
+        infos, info_stats = _trace_stage(
+            lambda: [training.show_training_info()
+                     for training in trainings], count)
+        _, message_stats = _trace_stage(
+            lambda: [info.get_message() for info in infos], count)
+    finally:
+        if not started:
+            tracemalloc.stop()
+    return dict(zip(RECORD_STAGES, (read_stats, info_stats, message_stats)))
+
+
+def profile_calls(workout_type: str, count: int = 1000,
+                  seed: int = 0) -> Dict[str, float]:
+    """Посчитать вызовы функций на запись для этапов обработки пакетов.
+
+    Учитываются вызовы функций Python и встроенных функций. В отличие
+    от времени их число не зависит от машины и её загрузки, поэтому
+    сравнение с базой не требует допуска на шум.
+    """
+    packages = list(generate_packages(workout_type, count, seed))
+    read_package = homework.read_package
+    calls = 0
+
+    def profiler(frame: object, event: str, arg: object) -> None:
+        nonlocal calls
+        if event == 'call' or event == 'c_call':
+            calls += 1
+
+    def measure(stage: Callable[[], Any]) -> Tuple[Any, float]:
+        nonlocal calls
+        calls = 0
+        sys.setprofile(profiler)
+        try:
+            result = stage()
+        finally:
+            sys.setprofile(None)
+        return result, round(calls / count, 2)
+
+    trainings, read_calls = measure(
+        lambda: [read_package(code, data) for code, data in packages])
+    infos, info_calls = measure(
+        lambda: [training.show_training_info() for training in trainings])
+    _, message_calls = measure(lambda: [info.get_message() for info in infos])
+    return dict(zip(RECORD_STAGES, (read_calls, info_calls, message_calls)))
+
+
+def compare_calls(calls: Dict[str, Dict[str, float]],
+                  baseline: Dict[str, Dict[str, float]],
+                  slack: float = CALL_SLACK) -> List[str]:
+    """Найти этапы, которым на запись нужно больше вызовов, чем в базе."""
+    regressions = []
+    for workout_type, stages in calls.items():
+        for stage, count in stages.items():
+            limit = baseline.get(workout_type, {}).get(stage)
+            if limit is not None and count > limit + slack:
+                regressions.append(f'{workout_type}/{stage}: {count} вызовов'
+                                   f' на запись, база {limit}')
+    return regressions
+
+
+def compare(results: Sequence[Dict[str, object]],
+            baseline: Sequence[Dict[str, object]],
+            tolerance: float = 0.25, scale: float = 1.0,
+            stages: Optional[Sequence[str]] = None) -> List[str]:
+    """Найти замеры, которые медленнее базовых больше чем на допуск.
+
+    ``scale`` - во сколько раз текущая машина медленнее той, на которой
+    снята база (отношение результатов ``calibrate``). Если задан
+    ``stages``, сравниваются только эти этапы.
+    """
+    reference = {(item['workout_type'], item['size'], item['stage']):
+                 item['ns_per_record'] * scale for item in baseline}
+    regressions = []
+    for item in results:
+        key = (item['workout_type'], item['size'], item['stage'])
+        if key not in reference or stages and key[2] not in stages:
+            continue
+        limit = reference[key] * (1 + tolerance)
+        if item['ns_per_record'] > limit:
+            regressions.append(
+                f"{'/'.join(map(str, key))}: {item['ns_per_record']:.1f}"
+                f" нс на запись, база {reference[key]:.1f}"
+            )
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Запустить замеры из командной строки."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', type=lambda x: int(float(x)),
+                        default=list(DEFAULT_SIZES),
+                        help='количество пакетов, например 1e3 1e7')
+    parser.add_argument('--types', nargs='+', default=list(homework.WORKOUT),
+                        choices=list(homework.WORKOUT))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='файл для результатов в JSON')
+    parser.add_argument('--baseline', help='файл базовых результатов')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='допустимое замедление, доля от базы')
+    parser.add_argument('--all-stages', action='store_true',
+                        help='сравнивать с базой каждый этап, а не только'
+                             ' сумму этапов')
+    parser.add_argument('--memory', action='store_true',
+                        help='измерить память этапов вместо времени')
+    args = parser.parse_args(argv)
+
+    if args.memory:
+        print(json.dumps({
+            workout_type: profile_memory(workout_type, max(args.sizes),
+                                         args.seed)
+            for workout_type in args.types
+        }, indent=2))
+        return 0
+
+    # Эталон замеряется до и после, чтобы захватить то же окно шума.
+    calibration = calibrate()
+    results = run_benchmark(args.sizes, args.types, args.repeat, args.seed)
+    calibration = min(calibration, calibrate())
+    calls = {workout_type: profile_calls(workout_type, seed=args.seed)
+             for workout_type in args.types}
+    report = json.dumps({
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'calibration_ns': calibration,
+        'calls': calls,
+        'results': results,
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as stream:
+            stream.write(report + '\n')
+    else:
+        print(report)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as stream:
+            baseline = json.load(stream)
+        scale = calibration / baseline.get('calibration_ns', calibration)
+        regressions = compare(results, baseline['results'], args.tolerance,
+                              scale, None if args.all_stages else (TOTAL,))
+        regressions += compare_calls(calls, baseline.get('calls', {}))
+        for regression in regressions:
+            print(f'Замедление: {regression}', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,33 @@
-from dataclasses import dataclass, asdict
-from typing import ClassVar, Dict, Type
+import ast
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, fields
+from heapq import heappush, heapreplace
+from itertools import islice
+from numbers import Real
+from operator import attrgetter
+from string import Formatter
+from typing import (TYPE_CHECKING, Callable, ClassVar, Dict, Iterable,
+                    Iterator, List, Mapping, NamedTuple, Optional, Sequence,
+                    TextIO, Tuple, Type, Union)
+
+if TYPE_CHECKING:
+    import argparse
+    import asyncio
+
+    import numpy as np
+
+
+Kernel = Callable[..., Tuple[float, float, float]]
 
 
 @dataclass
@@ -19,7 +47,113 @@ class InfoMessage:
 
     def get_message(self):
         """Возвращаем данные о тренировке."""
-        return(self.INFO_MESSAGE.format(**asdict(self)))
+        return self.INFO_MESSAGE.format_map(vars(self))
+
+
+class Instrumentation:
+    """Счётчики и гистограммы задержек этапов обработки пакетов.
+
+    Замеры группируются по этапу (``read_package``,
+    ``show_training_info``, ``main``) и типу тренировки. Пакеты
+    с неизвестным кодом тренировки считаются отдельно.
+    """
+
+    BUCKETS: ClassVar[Tuple[float, ...]] = (
+        1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 1e-3, 1e-2, 0.1, 1.0,
+    )
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        """Обнулить все счётчики."""
+        self._stages: Dict[Tuple[str, str], List[float]] = {}
+        self._rejected: Dict[str, int] = {}
+
+    def observe(self, stage: str, training_type: str,
+                seconds: float) -> None:
+        """Учесть длительность этапа для типа тренировки."""
+        key = (stage, training_type)
+        series = self._stages.get(key)
+        if series is None:
+            series = self._stages[key] = [0, 0.0] + [0] * (
+                len(self.BUCKETS) + 1)
+        series[0] += 1
+        series[1] += seconds
+        series[2 + bisect_left(self.BUCKETS, seconds)] += 1
+
+    def reject(self, workout_type: str) -> None:
+        """Учесть пакет с неподдерживаемым типом тренировки."""
+        self._rejected[workout_type] = self._rejected.get(workout_type,
+                                                          0) + 1
+
+    def snapshot(self) -> Dict[str, object]:
+        """Получить копию счётчиков в виде словаря."""
+        stages = {}
+        for (stage, training_type), series in sorted(self._stages.items()):
+            buckets = dict(zip(map(str, self.BUCKETS), series[2:]))
+            buckets['+Inf'] = series[-1]
+            stages.setdefault(stage, {})[training_type] = {
+                'count': series[0],
+                'sum': series[1],
+                'buckets': buckets,
+            }
+        return {'stages': stages, 'rejected': dict(self._rejected)}
+
+    def to_prometheus(self) -> str:
+        """Выгрузить счётчики в текстовом формате Prometheus."""
+        lines = [
+            '# HELP homework_stage_seconds Длительность этапов обработки.',
+            '# TYPE homework_stage_seconds histogram',
+        ]
+        for (stage, training_type), series in sorted(self._stages.items()):
+            labels = (f'stage="{_prometheus_label(stage)}",'
+                      f'training_type="{_prometheus_label(training_type)}"')
+            total = 0
+            for bound, count in zip(self.BUCKETS + (float('inf'),),
+                                    series[2:]):
+                total += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'homework_stage_seconds_bucket'
+                             f'{{{labels},le="{le}"}} {total}')
+            lines.append(f'homework_stage_seconds_sum{{{labels}}}'
+                         f' {series[1]!r}')
+            lines.append(f'homework_stage_seconds_count{{{labels}}}'
+                         f' {series[0]}')
+        lines.extend([
+            '# HELP homework_rejected_packages_total Пакеты'
+            ' с неподдерживаемым типом тренировки.',
+            '# TYPE homework_rejected_packages_total counter',
+        ])
+        for workout_type, count in sorted(self._rejected.items()):
+            label = _prometheus_label(workout_type)
+            lines.append(f'homework_rejected_packages_total'
+                         f'{{workout_type="{label}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _prometheus_label(value: str) -> str:
+    """Экранировать значение метки Prometheus."""
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+_instrumentation: Optional[Instrumentation] = None
+
+
+def enable_instrumentation(instrumentation: Optional[Instrumentation] = None
+                           ) -> Instrumentation:
+    """Включить сбор счётчиков и вернуть их хранилище."""
+    global _instrumentation
+    _instrumentation = instrumentation or Instrumentation()
+    return _instrumentation
+
+
+def disable_instrumentation() -> Optional[Instrumentation]:
+    """Выключить сбор счётчиков и вернуть накопленные значения."""
+    global _instrumentation
+    instrumentation, _instrumentation = _instrumentation, None
+    return instrumentation
 
 
 @dataclass
@@ -46,13 +180,39 @@ class Training:
         raise NotImplementedError("Определите get_spent_calories"
                                   "в {self.__class__.__name__}")
 
+    def get_metrics(self) -> Tuple[float, float, float]:
+        """Получить дистанцию, среднюю скорость и калории одним вызовом.
+
+        Для классов с расчётным ядром (``make_kernel``) дистанция,
+        скорость и калории считаются по одному разу в локальных
+        переменных плоской функции, иначе через методы ``get_*``.
+        Значения не кэшируются, поэтому изменение полей сразу
+        отражается в результате.
+        """
+        compiled = _KERNELS.get(self.__class__)
+        if compiled is None:
+            compiled = compile_kernel(self.__class__)
+        kernel, arguments = compiled
+        if kernel is None:
+            return (self.get_distance(),
+                    self.get_mean_speed(),
+                    self.get_spent_calories())
+        return kernel(*arguments(self))
+
     def show_training_info(self) -> InfoMessage:
         """Вернуть информационное сообщение о выполненной тренировке."""
-        return InfoMessage(self.__class__.__name__,
+        instrumentation = _instrumentation
+        if instrumentation is None:
+            return InfoMessage(self.__class__.__name__,
+                               self.duration,
+                               *self.get_metrics())
+        started = time.perf_counter()
+        info = InfoMessage(self.__class__.__name__,
                            self.duration,
-                           self.get_distance(),
-                           self.get_mean_speed(),
-                           self.get_spent_calories())
+                           *self.get_metrics())
+        instrumentation.observe('show_training_info', info.training_type,
+                                time.perf_counter() - started)
+        return info
 
 
 @dataclass
@@ -65,6 +225,24 @@ class Running(Training):
     COEFF_RUNNING_FACTOR: ClassVar[float] = 18.0
     COEFF_RUNNING_SUBTR: ClassVar[float] = 20.0
 
+    @classmethod
+    def make_kernel(cls) -> Kernel:
+        """Собрать расчётное ядро бега с константами класса."""
+        len_step = cls.LEN_STEP
+        m_in_km = cls.M_IN_KM
+        m_in_h = cls.M_IN_H
+        factor = cls.COEFF_RUNNING_FACTOR
+        subtrahend = cls.COEFF_RUNNING_SUBTR
+
+        def running_kernel(action: float, duration: float,
+                           weight: float) -> Tuple[float, float, float]:
+            distance = action * len_step / m_in_km
+            speed = distance / duration
+            return distance, speed, ((factor * speed - subtrahend)
+                                     * weight / m_in_km * duration * m_in_h)
+
+        return running_kernel
+
     def get_spent_calories(self) -> float:
         """Получить количество затраченных калорий для бега."""
         return ((self.COEFF_RUNNING_FACTOR * self.get_mean_speed()
@@ -72,6 +250,19 @@ class Running(Training):
                 * self.weight / self.M_IN_KM * self.duration * self.M_IN_H)
 
 
+def _array_power(base: 'np.ndarray', exponent: float) -> 'np.ndarray':
+    """Возвести массив NumPy в степень так же, как это делает ``float``.
+
+    NumPy заменяет ``** 2`` умножением, а ``float ** 2`` вызывает ``pow``
+    из libm. Результаты иногда расходятся в последнем знаке, и после
+    ``//`` калории отличаются на целую ступень. ``numpy.float_power``
+    считает через ``pow``, результат приводится к типу ``base``.
+    """
+    import numpy as np
+
+    return np.float_power(base, exponent).astype(base.dtype, copy=False)
+
+
 @dataclass
 class SportsWalking(Training):
     """Тренировка: спортивная ходьба."""
@@ -84,6 +275,29 @@ class SportsWalking(Training):
     COEFF_WALKING_2: ClassVar[float] = 0.029
     DEEGRE_RUNNING: ClassVar[float] = 2
 
+    @classmethod
+    def make_kernel(cls) -> Kernel:
+        """Собрать расчётное ядро спортивной ходьбы с константами класса."""
+        len_step = cls.LEN_STEP
+        m_in_km = cls.M_IN_KM
+        m_in_h = cls.M_IN_H
+        coeff_1 = cls.COEFF_WALKING_1
+        coeff_2 = cls.COEFF_WALKING_2
+        degree = cls.DEEGRE_RUNNING
+
+        def walking_kernel(action: float, duration: float, weight: float,
+                           height: float) -> Tuple[float, float, float]:
+            distance = action * len_step / m_in_km
+            speed = distance / duration
+            power = (speed**degree if speed.__class__ is float
+                     else _array_power(speed, degree))
+            return distance, speed, ((coeff_1 * weight
+                                      + (power // height)
+                                      * coeff_2 * weight)
+                                     * duration * m_in_h)
+
+        return walking_kernel
+
     def get_spent_calories(self) -> float:
         """Получить количество затраченных калорий для спортивной ходьбы."""
         return ((self.COEFF_WALKING_1 * self.weight
@@ -105,6 +319,23 @@ class Swimming(Training):
     COEFF_SWIMMING_2: ClassVar[float] = 2
     LEN_STEP: ClassVar[float] = 1.38
 
+    @classmethod
+    def make_kernel(cls) -> Kernel:
+        """Собрать расчётное ядро плавания с константами класса."""
+        len_step = cls.LEN_STEP
+        m_in_km = cls.M_IN_KM
+        coeff_1 = cls.COEFF_SWIMMING_1
+        coeff_2 = cls.COEFF_SWIMMING_2
+
+        def swimming_kernel(action: float, duration: float, weight: float,
+                            length_pool: float, count_pool: float
+                            ) -> Tuple[float, float, float]:
+            speed = length_pool * count_pool / m_in_km / duration
+            return (action * len_step / m_in_km, speed,
+                    (speed + coeff_1) * coeff_2 * weight)
+
+        return swimming_kernel
+
     def get_mean_speed(self) -> float:
         """Получить среднюю скорость движения во время плавания."""
         return (self.length_pool * self.count_pool
@@ -116,38 +347,1734 @@ class Swimming(Training):
                 * self.COEFF_SWIMMING_2 * self.weight)
 
 
+METRIC_METHODS = ('get_distance', 'get_mean_speed', 'get_spent_calories')
+_KERNELS: Dict[type, Tuple[Optional[Kernel], Optional[attrgetter]]] = {}
+
+
+def compile_kernel(training_class: Type[Training]
+                   ) -> Tuple[Optional[Kernel], Optional[attrgetter]]:
+    """Получить расчётное ядро класса тренировки и выборку его полей.
+
+    Ядро собирается один раз на класс: константы ``ClassVar`` на этот
+    момент подставляются в плоскую функцию, порядок операций совпадает
+    с методами ``get_*``. Если подкласс переопределил какой-либо
+    из методов расчёта, ядро не используется и возвращается ``None``.
+    """
+    owner = next((base for base in training_class.__mro__
+                  if 'make_kernel' in vars(base)), None)
+    if owner is None or any(getattr(training_class, name)
+                            is not getattr(owner, name)
+                            for name in METRIC_METHODS):
+        compiled = None, None
+    else:
+        names = [field.name for field in fields(owner)]
+        compiled = training_class.make_kernel(), attrgetter(*names)
+    _KERNELS[training_class] = compiled
+    return compiled
+
+
+class PackageError(Exception):
+    """Ошибка в пакете данных от датчиков."""
+
+    def __init__(self, message: str, workout_type: str,
+                 data: Optional[Sequence[float]] = None) -> None:
+        super().__init__(message)
+        self.workout_type = workout_type
+        self.data = data
+
+    @property
+    def package(self) -> Tuple[str, Optional[Sequence[float]]]:
+        """Пакет, вызвавший ошибку."""
+        return self.workout_type, self.data
+
+
+class UnsupportedWorkoutError(PackageError):
+    """Пакет с неподдерживаемым кодом тренировки."""
+
+
+class MalformedPackageError(PackageError, TypeError):
+    """Пакет с неверным количеством или типом значений."""
+
+
+class WorkoutSpec(NamedTuple):
+    """Описание типа тренировки в реестре."""
+    training_class: Type[Training]
+    arity: int
+    fields: Tuple[str, ...]
+
+
+WORKOUT: Dict[str, Type[Training]] = {}
+WORKOUT_SPECS: Dict[str, WorkoutSpec] = {}
+_NUMERIC_TYPES = frozenset({int, float})
+
+
+def register_workout(workout_type: str, training_class: Type[Training]
+                     ) -> WorkoutSpec:
+    """Зарегистрировать класс тренировки под кодом пакета."""
+    names = tuple(field.name for field in fields(training_class))
+    spec = WorkoutSpec(training_class, len(names), names)
+    WORKOUT[workout_type] = training_class
+    WORKOUT_SPECS[workout_type] = spec
+    return spec
+
+
+register_workout('SWM', Swimming)
+register_workout('RUN', Running)
+register_workout('WLK', SportsWalking)
+
+
+def get_workout_spec(workout_type: str,
+                     data: Optional[Sequence[float]] = None) -> WorkoutSpec:
+    """Получить описание тренировки по коду пакета."""
+    spec = WORKOUT_SPECS.get(workout_type)
+    if spec is None:
+        supported = ', '.join(f'{code} - {spec.training_class.__name__}'
+                              for code, spec in WORKOUT_SPECS.items())
+        raise UnsupportedWorkoutError(
+            f"Тренировка типа: {workout_type} Неподдерживается.\n"
+            f"Поддерживаемые типы: {supported}",
+            workout_type, data)
+    return spec
+
+
+def get_workout(workout_type: str) -> Type[Training]:
+    """Получить класс тренировки по коду пакета."""
+    return get_workout_spec(workout_type).training_class
+
+
+def validate_package(workout_type: str,
+                     data: Sequence[float]) -> WorkoutSpec:
+    """Проверить код, количество и типы значений пакета.
+
+    Возвращает описание тренировки из реестра.
+    """
+    spec = get_workout_spec(workout_type, data)
+    if len(data) != spec.arity:
+        raise MalformedPackageError(
+            f"{spec.training_class.__name__} ожидает {spec.arity} значений"
+            f" ({', '.join(spec.fields)}), получено {len(data)}",
+            workout_type, data)
+    if not _NUMERIC_TYPES.issuperset(map(type, data)):
+        for value in data:
+            if isinstance(value, bool) or not isinstance(value, Real):
+                raise MalformedPackageError(
+                    f"{spec.training_class.__name__} ожидает числа,"
+                    f" получено {value!r}",
+                    workout_type, data)
+    return spec
+
+
 def read_package(workout_type: str, data: list) -> Training:
     """Прочитать данные полученные от датчиков."""
+    spec = WORKOUT_SPECS.get(workout_type)
+    if (spec is not None and len(data) == spec.arity
+            and _instrumentation is None):
+        # На пакетах из 3-5 значений цикл дешевле issuperset(map(type)).
+        for value in data:
+            if value.__class__ not in _NUMERIC_TYPES:
+                break
+        else:
+            return spec.training_class(*data)
+    instrumentation = _instrumentation
+    if instrumentation is None:
+        return validate_package(workout_type, data).training_class(*data)
+    started = time.perf_counter()
+    try:
+        spec = validate_package(workout_type, data)
+    except UnsupportedWorkoutError:
+        instrumentation.reject(workout_type)
+        raise
+    training = spec.training_class(*data)
+    instrumentation.observe('read_package', training.__class__.__name__,
+                            time.perf_counter() - started)
+    return training
+
+
+BATCH_DTYPES = ('float32', 'float64')
+
+
+def compute_batch(workout_type: str,
+                  columns: Mapping[str, Sequence[float]],
+                  dtype: str = 'float64'
+                  ) -> Dict[str, Sequence[float]]:
+    """Рассчитать дистанцию, скорость и калории для столбцов пакетов.
+
+    Столбцы передаются по именам полей класса тренировки
+    (``action``, ``duration``, ``weight`` и т.д.). Формулы классов
+    применяются к массивам NumPy целиком, поэтому с ``dtype='float64'``
+    результаты совпадают с расчётом по одному объекту. ``float32``
+    вдвое сокращает память и объём данных ценой точности, см.
+    ``batch_deviation``.
+    """
+    import numpy as np
+
+    if dtype not in BATCH_DTYPES:
+        raise ValueError(f'Неподдерживаемый тип данных {dtype}, '
+                         f'допустимы: {", ".join(BATCH_DTYPES)}')
+    spec = get_workout_spec(workout_type)
+    values = {}
+    for name in spec.fields:
+        if name not in columns:
+            raise ValueError(f"Для тренировки {workout_type} не передан"
+                             f" столбец {name}")
+        values[name] = np.asarray(columns[name], dtype=dtype)
+    training = spec.training_class(**values)
+    distance, speed, calories = training.get_metrics()
+    return {'distance': distance, 'speed': speed, 'calories': calories}
+
+
+def batch_deviation(workout_type: str,
+                    columns: Mapping[str, Sequence[float]],
+                    dtype: str = 'float32'
+                    ) -> Dict[str, Dict[str, float]]:
+    """Найти наибольшее отклонение пакетного расчёта от эталонного.
+
+    Эталон - расчёт в ``float64``, совпадающий с методами объектов.
+    Для каждой метрики возвращается наибольшее абсолютное
+    (``absolute``) и относительное (``relative``) отклонение.
+    """
+    import numpy as np
+
+    reference = compute_batch(workout_type, columns)
+    result = compute_batch(workout_type, columns, dtype)
+    deviation = {}
+    for metric, expected in reference.items():
+        error = np.abs(np.asarray(result[metric], dtype=np.float64)
+                       - expected)
+        relative = np.divide(error, np.abs(expected),
+                             out=np.zeros_like(error), where=expected != 0)
+        deviation[metric] = {
+            'absolute': float(error.max(initial=0)),
+            'relative': float(relative.max(initial=0)),
+        }
+    return deviation
+
+
+class TrainingBatch:
+    """Компактное столбцовое хранилище тренировок разных типов.
+
+    Поля каждого типа тренировки хранятся в отдельных массивах
+    ``array('d')``, а порядок записей задаётся столбцами кода типа
+    и номера строки внутри типа. Объекты ``Training`` создаются
+    только по запросу.
+    """
+
+    def __init__(self,
+                 packages: Iterable[Tuple[str, Sequence[float]]] = ()
+                 ) -> None:
+        self._types = tuple(WORKOUT_SPECS)
+        self._codes = array('B')
+        self._rows = array('I')
+        self._columns: Dict[str, Dict[str, array]] = {
+            workout_type: {name: array('d') for name in spec.fields}
+            for workout_type, spec in WORKOUT_SPECS.items()
+        }
+        self.extend(packages)
+
+    def append(self, workout_type: str, data: Sequence[float]) -> None:
+        """Добавить пакет в хранилище."""
+        validate_package(workout_type, data)
+        columns = self._columns[workout_type]
+        values = [float(value) for value in data]
+        self._codes.append(self._types.index(workout_type))
+        self._rows.append(len(columns['action']))
+        for column, value in zip(columns.values(), values):
+            column.append(value)
+
+    def extend(self, packages: Iterable[Tuple[str, Sequence[float]]]
+               ) -> None:
+        """Добавить пакеты из последовательности или потока."""
+        for workout_type, data in packages:
+            self.append(workout_type, data)
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __getitem__(self, index: int) -> Training:
+        workout_type = self._types[self._codes[index]]
+        row = self._rows[index]
+        return WORKOUT_SPECS[workout_type].training_class(
+            *[column[row] for column in self._columns[workout_type].values()]
+        )
+
+    def __iter__(self) -> Iterator[Training]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def columns(self, workout_type: str) -> Dict[str, array]:
+        """Получить столбцы полей всех тренировок заданного типа."""
+        get_workout_spec(workout_type)
+        return dict(self._columns[workout_type])
+
+    def compute(self, dtype: str = 'float64'
+                ) -> Dict[str, Dict[str, Sequence[float]]]:
+        """Рассчитать метрики по типам тренировок через ``compute_batch``.
+
+        При ``float64`` столбцы передаются в NumPy без копирования.
+        """
+        return {workout_type: compute_batch(workout_type, columns, dtype)
+                for workout_type, columns in self._columns.items()
+                if columns['action']}
+
+    @property
+    def nbytes(self) -> int:
+        """Объём памяти, занятый массивами хранилища, в байтах."""
+        arrays = [self._codes, self._rows]
+        for columns in self._columns.values():
+            arrays.extend(columns.values())
+        return sum(sys.getsizeof(values) for values in arrays)
+
+
+def _process_chunk(chunk: List[Tuple[str, list]]) -> List[tuple]:
+    """Рассчитать результаты тренировок для одной пачки пакетов.
+
+    Результаты возвращаются кортежами ``RESULT_FIELDS``: их передача
+    между процессами дешевле, чем объектов ``InfoMessage``.
+    """
+    return [_result_values(read_package(workout_type, data)
+                           .show_training_info())
+            for workout_type, data in chunk]
+
+
+def _process_lines(fmt: str, first_lineno: int, lines: List[str]
+                   ) -> Tuple[List[tuple], List[Tuple[int, str, str]]]:
+    """Разобрать и рассчитать пачку строк входного потока.
+
+    Возвращает кортежи результатов и ошибки ``(номер, строка, причина)``
+    так же, как их описывает ``iter_info_messages``.
+    """
+    rows = []
+    errors = []
+    for lineno, line in enumerate(lines, first_lineno):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            workout_type, data = parse_package_line(line, fmt)
+            info = read_package(workout_type, data).show_training_info()
+        except Exception as exc:
+            errors.append((lineno, line, str(exc)))
+            continue
+        rows.append(_result_values(info))
+    return rows, errors
+
+
+def _map_chunks(function: Callable[..., object], chunks: Iterable[tuple],
+                workers: Optional[int]) -> Iterator[object]:
+    """Выполнить ``function`` над пачками в пуле процессов по порядку.
+
+    В работе одновременно находится не больше двух пачек на процесс.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    with ProcessPoolExecutor(workers) as executor:
+        for chunk in chunks:
+            pending.append(executor.submit(function, *chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def process_parallel(packages: Iterable[Tuple[str, list]],
+                     chunk_size: int = 10000,
+                     workers: Optional[int] = None) -> Iterator[InfoMessage]:
+    """Рассчитать результаты тренировок в пуле процессов.
+
+    Поток пакетов делится на пачки по ``chunk_size`` штук, которые
+    обрабатываются ``workers`` процессами (по умолчанию по числу ядер).
+    Результаты возвращаются в порядке входных пакетов. Для файлов
+    пакетов лучше подходит ``process_lines_parallel``: там строки
+    разбираются тоже в процессах пула.
+    """
+    if chunk_size < 1:
+        raise ValueError("Размер пачки должен быть положительным")
+    packages = iter(packages)
+    chunks = iter(lambda: (list(islice(packages, chunk_size)),), ([],))
+    for rows in _map_chunks(_process_chunk, chunks, workers):
+        for row in rows:
+            yield InfoMessage(*row)
+
+
+PACKED_MAGIC = b'HWPK\x01\x00\x00\x00'
+PACKED_FIELDS = max(spec.arity for spec in WORKOUT_SPECS.values())
+_PACKED_RECORD = struct.Struct(f'<8s{PACKED_FIELDS}d')
+
+
+def write_packed(path: str, packages: Iterable[Tuple[str, Sequence[float]]],
+                 append: bool = False, chunk_size: int = 4096) -> int:
+    """Записать пакеты в двоичный файл с записями фиксированной длины.
+
+    Файл начинается с ``PACKED_MAGIC``, каждая запись занимает
+    ``_PACKED_RECORD.size`` байт: код тренировки (8 байт) и
+    ``PACKED_FIELDS`` значений float64 в порядке little-endian,
+    неиспользуемые поля равны нулю. Тренировки с кодом длиннее 8 байт
+    или которым нужно больше ``PACKED_FIELDS`` значений, в этот формат
+    не помещаются. Возвращает количество записанных пакетов.
+    """
+    count = 0
+    with open(path, 'ab' if append else 'wb') as stream:
+        if stream.tell() == 0:
+            stream.write(PACKED_MAGIC)
+        chunk = bytearray()
+        for workout_type, data in packages:
+            arity = validate_package(workout_type, data).arity
+            if arity > PACKED_FIELDS:
+                raise ValueError(
+                    f"Тренировка {workout_type} ожидает {arity} значений,"
+                    f" двоичный формат вмещает {PACKED_FIELDS}")
+            code = workout_type.encode('ascii')
+            if len(code) > 8:
+                raise ValueError(f"Код тренировки {workout_type} длиннее"
+                                 " 8 байт двоичного формата")
+            values = list(data) + [0.0] * (PACKED_FIELDS - arity)
+            chunk += _PACKED_RECORD.pack(code, *values)
+            count += 1
+            if count % chunk_size == 0:
+                stream.write(chunk)
+                chunk.clear()
+        stream.write(chunk)
+    return count
+
+
+class PackedReader:
+    """Чтение двоичного файла пакетов через ``mmap`` без копирования.
+
+    Записи доступны как пакеты ``(workout_type, data)`` для
+    ``read_package`` и как представления NumPy для ``compute_batch``.
+    Значения хранятся в little-endian: на таких платформах они читаются
+    прямо из отображения, на остальных распаковываются ``struct``.
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as stream:
+            header = stream.read(len(PACKED_MAGIC))
+            size = os.fstat(stream.fileno()).st_size
+            if (header != PACKED_MAGIC
+                    or (size - len(header)) % _PACKED_RECORD.size):
+                raise ValueError(f"{path} не является файлом пакетов")
+            self._mmap = mmap.mmap(stream.fileno(), 0,
+                                   access=mmap.ACCESS_READ)
+        self._bytes = memoryview(self._mmap)
+        self._floats = None
+        if sys.byteorder == 'little':
+            self._floats = self._bytes[len(PACKED_MAGIC):].cast('d')
+        self._arity = {workout_type: spec.arity
+                       for workout_type, spec in WORKOUT_SPECS.items()}
+
+    def __enter__(self) -> 'PackedReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Освободить отображение файла.
+
+        Если снаружи остались представления NumPy, отображение
+        закроется сборщиком мусора после их удаления.
+        """
+        if self._floats is not None:
+            self._floats.release()
+        self._bytes.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+    def __len__(self) -> int:
+        return ((len(self._bytes) - len(PACKED_MAGIC))
+                // _PACKED_RECORD.size)
+
+    def __iter__(self) -> Iterator[Tuple[str, list]]:
+        floats = self._floats
+        data = self._bytes
+        if floats is None:
+            yield from self._unpack()
+            return
+        step = PACKED_FIELDS + 1
+        offset = len(PACKED_MAGIC)
+        for index in range(len(self)):
+            start = offset + index * _PACKED_RECORD.size
+            workout_type = bytes(data[start:start + 8]).rstrip(b'\0')
+            workout_type = workout_type.decode('ascii', 'replace')
+            arity = self._arity.get(workout_type)
+            if arity is None:
+                raise ValueError(f"Запись {index}: неизвестный код"
+                                 f" тренировки {workout_type!r}")
+            base = index * step + 1
+            yield workout_type, floats[base:base + arity].tolist()
+
+    def _unpack(self) -> Iterator[Tuple[str, list]]:
+        """Распаковать записи на платформе с порядком байтов big-endian."""
+        records = _PACKED_RECORD.iter_unpack(self._bytes[len(PACKED_MAGIC):])
+        for index, (workout_type, *values) in enumerate(records):
+            workout_type = workout_type.rstrip(b'\0').decode('ascii',
+                                                             'replace')
+            arity = self._arity.get(workout_type)
+            if arity is None:
+                raise ValueError(f"Запись {index}: неизвестный код"
+                                 f" тренировки {workout_type!r}")
+            yield workout_type, values[:arity]
+
+    def trainings(self) -> Iterator[Training]:
+        """Создавать тренировки из записей файла по одной."""
+        for workout_type, data in self:
+            yield read_package(workout_type, data)
+
+    def records(self) -> 'np.ndarray':
+        """Получить записи файла структурированным массивом NumPy."""
+        import numpy as np
+
+        dtype = np.dtype([('workout_type', 'S8'),
+                          ('values', '<f8', (PACKED_FIELDS,))])
+        return np.frombuffer(self._mmap, dtype=dtype,
+                             offset=len(PACKED_MAGIC))
+
+    def columns(self, workout_type: str) -> Dict[str, 'np.ndarray']:
+        """Получить столбцы полей для тренировок заданного типа.
+
+        Если в файле только этот тип тренировок, столбцы являются
+        представлениями отображённого файла, иначе отбираются маской.
+        """
+        records = self.records()
+        names = get_workout_spec(workout_type).fields
+        mask = records['workout_type'] == workout_type.encode('ascii')
+        values = records['values']
+        if not mask.all():
+            values = values[mask]
+        return {name: values[:, index] for index, name in enumerate(names)}
+
+    def compute(self, workout_type: str,
+                dtype: str = 'float64') -> Dict[str, Sequence[float]]:
+        """Рассчитать метрики тренировок типа через ``compute_batch``."""
+        return compute_batch(workout_type, self.columns(workout_type),
+                             dtype)
+
+
+class LiveSession:
+    """Расчёт метрик тренировки по ходу занятия.
+
+    Сессия создаётся из тех же данных, что и ``read_package``, и
+    принимает накопленные показания датчиков: шаги или гребки
+    (``action``), число бассейнов (``count_pool``) и прошедшее время
+    (``duration``). Каждое обновление пересчитывает дистанцию,
+    скорость и калории за постоянное время в одном и том же объекте
+    тренировки, а итог совпадает с ``show_training_info``. Пока
+    ``duration`` равно нулю, скорость и калории равны ``0.0``,
+    а дистанция считается по ``action``.
+    """
+
+    __slots__ = ('training', 'distance', 'speed', 'calories')
+
+    def __init__(self, workout_type: str, data: Sequence[float]) -> None:
+        self.training = read_package(workout_type, data)
+        self._refresh()
+
+    def _refresh(self) -> None:
+        training = self.training
+        if training.duration == 0:
+            self.distance, self.speed, self.calories = (
+                training.get_distance(), 0.0, 0.0)
+        else:
+            self.distance, self.speed, self.calories = (
+                training.get_metrics())
+
+    def update(self, duration: float, action: Optional[float] = None,
+               count_pool: Optional[float] = None
+               ) -> Tuple[float, float, float]:
+        """Учесть новые показания и вернуть дистанцию, скорость, калории."""
+        training = self.training
+        if count_pool is not None:
+            if not hasattr(training, 'count_pool'):
+                raise TypeError(f"{training.__class__.__name__}"
+                                " не считает бассейны")
+            training.count_pool = count_pool
+        if action is not None:
+            training.action = action
+        training.duration = duration
+        self._refresh()
+        return self.distance, self.speed, self.calories
+
+    def show_training_info(self) -> InfoMessage:
+        """Вернуть информационное сообщение о текущем состоянии."""
+        return InfoMessage(self.training.__class__.__name__,
+                           self.training.duration,
+                           self.distance, self.speed, self.calories)
+
+
+class PackageCache:
+    """Ограниченный LRU-кэш результатов для повторных пакетов.
+
+    Ключом служит пакет ``(workout_type, tuple(data))``: целые и
+    вещественные значения с равной величиной дают один ключ. Пакеты
+    проверяются до поиска в кэше, ошибочные не кэшируются. При
+    попадании возвращается сохранённый ``InfoMessage`` и готовый текст
+    без повторного расчёта. Записи старше ``ttl`` секунд считаются
+    устаревшими, при переполнении вытесняются давно не использованные.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        if maxsize < 1:
+            raise ValueError("Размер кэша должен быть положительным")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, workout_type: str,
+                data: Sequence[float]) -> Tuple[float, InfoMessage, str]:
+        # True == 1 и hash(True) == hash(1): без проверки пакет с bool
+        # попал бы в запись корректного пакета.
+        if not _NUMERIC_TYPES.issuperset(map(type, data)):
+            validate_package(workout_type, data)
+        key = (workout_type, tuple(data))
+        entry = self._entries.get(key)
+        if entry is not None:
+            if self.ttl is None or self._clock() < entry[0]:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry
+            del self._entries[key]
+            self.expirations += 1
+        self.misses += 1
+        info = read_package(workout_type, data).show_training_info()
+        expires = math.inf if self.ttl is None else self._clock() + self.ttl
+        entry = self._entries[key] = (expires, info, render_message(info))
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+        return entry
+
+    def info(self, workout_type: str, data: Sequence[float]) -> InfoMessage:
+        """Получить результат тренировки для пакета."""
+        return self._lookup(workout_type, data)[1]
+
+    def message(self, workout_type: str, data: Sequence[float]) -> str:
+        """Получить текст ``get_message()`` для пакета."""
+        return self._lookup(workout_type, data)[2]
+
+    def clear(self) -> None:
+        """Удалить все записи, не сбрасывая статистику."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Получить статистику попаданий, промахов и вытеснений."""
+        return {
+            'size': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+
+
+class PackageLineError(ValueError):
+    """Ошибка разбора пакета во входном потоке."""
+
+    def __init__(self, lineno: int, line: str, reason: str) -> None:
+        super().__init__(f"Строка {lineno}: {reason}")
+        self.lineno = lineno
+        self.line = line
+        self.reason = reason
+
+
+ErrorHandler = Callable[[PackageLineError], None]
+InputErrorHandler = Callable[[str, OSError], None]
+
+
+def report_error(error: PackageLineError) -> None:
+    """Сообщить об ошибочной строке в stderr."""
+    print(error, file=sys.stderr)
+
+
+def report_input_error(source: str, error: OSError) -> None:
+    """Сообщить о входном файле, который не удалось открыть, в stderr."""
+    print(f"Файл {source}: {error.strerror or error}", file=sys.stderr)
+
+
+def parse_package_line(line: str, fmt: str = 'jsonl') -> Tuple[str, list]:
+    """Разобрать одну строку JSONL или CSV в пакет (тип, данные)."""
+    if fmt == 'csv':
+        workout_type, *values = [value.strip() for value in line.split(',')]
+        return workout_type, [float(value) for value in values]
+    if fmt != 'jsonl':
+        raise ValueError(f"Неизвестный формат пакетов: {fmt}")
+    package = json.loads(line)
+    if isinstance(package, dict):
+        package = [package.get('workout_type'), package.get('data')]
+    if (not isinstance(package, list) or len(package) != 2
+            or not isinstance(package[0], str)
+            or not isinstance(package[1], list)):
+        raise ValueError("Ожидается пакет вида [workout_type, data]")
+    return package[0], package[1]
+
 
-    WORKOUT: Dict[str, Type[Training]] = {
-        'SWM': Swimming,
-        'RUN': Running,
-        'WLK': SportsWalking,
+def _input_format(path: str, fmt: Optional[str]) -> str:
+    """Определить формат файла пакетов по расширению, если не задан."""
+    if fmt is not None:
+        return fmt
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+def _iter_numbered_packages(source: Union[str, TextIO],
+                            fmt: Optional[str],
+                            on_error: ErrorHandler
+                            ) -> Iterator[Tuple[int, str, str, list]]:
+    """Лениво читать пакеты вместе с номерами и текстом строк."""
+    if isinstance(source, str) and source != '-':
+        with open(source, encoding='utf-8') as stream:
+            yield from _iter_numbered_packages(
+                stream, _input_format(source, fmt), on_error)
+        return
+    stream = sys.stdin if source == '-' else source
+    for lineno, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            workout_type, data = parse_package_line(line, fmt or 'jsonl')
+        except ValueError as exc:
+            on_error(PackageLineError(lineno, line, str(exc)))
+            continue
+        yield lineno, line, workout_type, data
+
+
+def iter_packages(source: Union[str, TextIO], fmt: Optional[str] = None,
+                  on_error: ErrorHandler = report_error
+                  ) -> Iterator[Tuple[str, list]]:
+    """Лениво читать пакеты из файла, потока или stdin (``'-'``).
+
+    Формат определяется по расширению файла (``.csv`` или JSONL),
+    ошибочные строки передаются в ``on_error`` и пропускаются.
+    """
+    packages = _iter_numbered_packages(source, fmt, on_error)
+    for _, _, workout_type, data in packages:
+        yield workout_type, data
+
+
+def iter_trainings(source: Union[str, TextIO], fmt: Optional[str] = None,
+                   on_error: ErrorHandler = report_error
+                   ) -> Iterator[Training]:
+    """Лениво создавать тренировки из входного потока пакетов."""
+    packages = _iter_numbered_packages(source, fmt, on_error)
+    for lineno, line, workout_type, data in packages:
+        try:
+            training = read_package(workout_type, data)
+        except PackageError as exc:
+            on_error(PackageLineError(lineno, line, str(exc)))
+            continue
+        yield training
+
+
+def iter_info_messages(source: Union[str, TextIO],
+                       fmt: Optional[str] = None,
+                       on_error: ErrorHandler = report_error
+                       ) -> Iterator[InfoMessage]:
+    """Лениво рассчитывать результаты тренировок из входного потока."""
+    packages = _iter_numbered_packages(source, fmt, on_error)
+    for lineno, line, workout_type, data in packages:
+        try:
+            info = read_package(workout_type, data).show_training_info()
+        except Exception as exc:
+            on_error(PackageLineError(lineno, line, str(exc)))
+            continue
+        yield info
+
+
+def _iter_inputs(sources: Iterable[Union[str, TextIO]],
+                 fmt: Optional[str], on_error: ErrorHandler,
+                 on_input_error: InputErrorHandler) -> Iterator[InfoMessage]:
+    """Рассчитать результаты из нескольких входов по очереди.
+
+    Файлы, которые не удалось открыть или прочитать, передаются
+    в ``on_input_error`` и пропускаются.
+    """
+    for source in sources:
+        try:
+            yield from iter_info_messages(source, fmt, on_error)
+        except OSError as exc:
+            on_input_error(source, exc)
+
+
+def _iter_line_chunks(sources: Iterable[Union[str, TextIO]],
+                      fmt: Optional[str], chunk_size: int,
+                      on_input_error: Optional[InputErrorHandler] = None
+                      ) -> Iterator[Tuple[str, int, List[str]]]:
+    """Нарезать входные потоки на пачки строк с номером первой строки."""
+    for source in sources:
+        if isinstance(source, str) and source != '-':
+            try:
+                with open(source, encoding='utf-8') as stream:
+                    yield from _iter_line_chunks(
+                        [stream], _input_format(source, fmt), chunk_size)
+            except OSError as exc:
+                if on_input_error is None:
+                    raise
+                on_input_error(source, exc)
+            continue
+        stream = sys.stdin if source == '-' else source
+        lineno = 1
+        while True:
+            lines = list(islice(stream, chunk_size))
+            if not lines:
+                break
+            yield fmt or 'jsonl', lineno, lines
+            lineno += len(lines)
+
+
+def process_lines_parallel(sources: Iterable[Union[str, TextIO]],
+                           fmt: Optional[str] = None,
+                           on_error: ErrorHandler = report_error,
+                           chunk_size: int = 10000,
+                           workers: Optional[int] = None,
+                           on_input_error: Optional[InputErrorHandler] = None
+                           ) -> Iterator[InfoMessage]:
+    """Рассчитать результаты из файлов или потоков пакетов в пуле процессов.
+
+    Родительский процесс только нарезает входные строки на пачки,
+    разбор, проверка и расчёт идут в процессах пула. Ошибочные строки
+    передаются в ``on_error`` так же, как в ``iter_info_messages``,
+    результаты возвращаются по порядку. Если задан ``on_input_error``,
+    файлы, которые не удалось открыть, передаются в него и
+    пропускаются, иначе ``OSError`` выбрасывается.
+    """
+    if chunk_size < 1:
+        raise ValueError("Размер пачки должен быть положительным")
+    chunks = _iter_line_chunks(sources, fmt, chunk_size, on_input_error)
+    for rows, errors in _map_chunks(_process_lines, chunks, workers):
+        for error in errors:
+            on_error(PackageLineError(*error))
+        for row in rows:
+            yield InfoMessage(*row)
+
+
+def compile_message_template(template: str
+                             ) -> Optional[Callable[[InfoMessage], str]]:
+    """Собрать быстрый форматтер сообщений из шаблона ``str.format``.
+
+    Поля вида ``{name}`` и ``{name:.Nf}`` переводятся в %-форматирование
+    с заранее собранным ``attrgetter``. Для остальных шаблонов
+    возвращается ``None``.
+    """
+    parts = []
+    names = []
+    for literal, name, spec, conversion in Formatter().parse(template):
+        parts.append(literal.replace('%', '%%'))
+        if name is None:
+            continue
+        if (not name.isidentifier() or conversion
+                or not re.fullmatch(r'(\.\d+f)?', spec)):
+            return None
+        parts.append(f'%{spec}' if spec else '%s')
+        names.append(name)
+    pattern = ''.join(parts)
+    if not names:
+        return lambda message: pattern % ()
+    getter = attrgetter(*names)
+    if len(names) == 1:
+        return lambda message: pattern % (getter(message),)
+    return lambda message: pattern % getter(message)
+
+
+_format_message = compile_message_template(InfoMessage.INFO_MESSAGE)
+
+
+def render_message(message: InfoMessage) -> str:
+    """Получить текст ``get_message()`` через собранный форматтер."""
+    if (_format_message is not None
+            and message.INFO_MESSAGE is InfoMessage.INFO_MESSAGE):
+        return _format_message(message)
+    return message.get_message()
+
+
+def _write_lines(lines: Iterable[str], sink: TextIO, batch_size: int) -> int:
+    """Записать строки в поток пачками и вернуть их количество."""
+    batch = []
+    count = 0
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            sink.write('\n'.join(batch) + '\n')
+            count += len(batch)
+            batch.clear()
+    if batch:
+        sink.write('\n'.join(batch) + '\n')
+        count += len(batch)
+    return count
+
+
+def write_report(messages: Iterable[InfoMessage],
+                 sink: Optional[TextIO] = None,
+                 batch_size: int = 1024) -> int:
+    """Записать сообщения о тренировках в поток пачками строк.
+
+    Вывод совпадает побайтно с ``print(message.get_message())``
+    для каждого сообщения. Возвращает количество записанных сообщений.
+    """
+    return _write_lines(map(render_message, messages),
+                        sys.stdout if sink is None else sink, batch_size)
+
+
+RESULT_FIELDS = ('training_type', 'duration', 'distance', 'speed',
+                 'calories')
+_result_values = attrgetter(*RESULT_FIELDS)
+
+
+def _jsonl_line(message: InfoMessage) -> str:
+    """Получить строку JSON с результатом тренировки."""
+    return json.dumps(dict(zip(RESULT_FIELDS, _result_values(message))),
+                      ensure_ascii=False)
+
+
+def _csv_line(message: InfoMessage) -> str:
+    """Получить строку CSV с результатом тренировки."""
+    return ','.join(map(str, _result_values(message)))
+
+
+LINE_FORMATS: Dict[str, Tuple[Optional[str],
+                              Callable[[InfoMessage], str]]] = {
+    'text': (None, render_message),
+    'jsonl': (None, _jsonl_line),
+    'csv': (','.join(RESULT_FIELDS), _csv_line),
+}
+
+
+def write_jsonl(messages: Iterable[InfoMessage],
+                sink: Optional[TextIO] = None,
+                batch_size: int = 1024) -> int:
+    """Записать результаты тренировок в поток строками JSON."""
+    return _write_lines(map(_jsonl_line, messages),
+                        sys.stdout if sink is None else sink, batch_size)
+
+
+def write_csv(messages: Iterable[InfoMessage],
+              sink: Optional[TextIO] = None,
+              batch_size: int = 1024) -> int:
+    """Записать результаты тренировок в поток CSV с заголовком."""
+    sink = sys.stdout if sink is None else sink
+    sink.write(LINE_FORMATS['csv'][0] + '\n')
+    return _write_lines(map(_csv_line, messages), sink, batch_size)
+
+
+class OutputPipeline:
+    """Расчёт результатов и их запись в отдельном потоке.
+
+    Расчёт выполняется в вызывающем потоке, который складывает пачки
+    по ``batch_size`` результатов в очередь глубиной ``queue_depth``.
+    Поток записи форматирует пачки (``fmt`` из ``LINE_FORMATS``)
+    и пишет их в ``sink``. Медленный приёмник останавливает расчёт,
+    когда очередь заполнена. Ошибка любой из сторон останавливает обе
+    и передаётся вызывающему.
+    """
+
+    def __init__(self, sink: Optional[TextIO] = None, fmt: str = 'text',
+                 queue_depth: int = 8, batch_size: int = 1024) -> None:
+        import queue
+
+        if queue_depth < 1 or batch_size < 1:
+            raise ValueError("Глубина очереди и размер пачки должны быть"
+                             " положительными")
+        self.header, self.format_line = LINE_FORMATS[fmt]
+        self.sink = sys.stdout if sink is None else sink
+        self.batch_size = batch_size
+        self.written = 0
+        self._batches: queue.Queue = queue.Queue(queue_depth)
+        self._failures: List[BaseException] = []
+        self._writer = None
+
+    def run(self, messages: Iterable[InfoMessage]) -> int:
+        """Обработать поток результатов, вернуть число записанных."""
+        import threading
+
+        self._writer = threading.Thread(target=self._write,
+                                        name='homework-writer', daemon=True)
+        self._writer.start()
+        try:
+            messages = iter(messages)
+            while True:
+                batch = list(islice(messages, self.batch_size))
+                if not batch:
+                    break
+                self._put(batch)
+        finally:
+            self._put(None)
+            self._writer.join()
+        if self._failures:
+            raise self._failures[0]
+        return self.written
+
+    def _put(self, batch: Optional[List[InfoMessage]]) -> None:
+        import queue
+
+        while self._writer.is_alive():
+            try:
+                self._batches.put(batch, timeout=0.05)
+                return
+            except queue.Full:
+                continue
+        if self._failures:
+            raise self._failures[0]
+
+    def _write(self) -> None:
+        try:
+            if self.header is not None:
+                self.sink.write(self.header + '\n')
+            while True:
+                batch = self._batches.get()
+                if batch is None:
+                    return
+                self.sink.write('\n'.join(map(self.format_line, batch))
+                                + '\n')
+                self.written += len(batch)
+        except BaseException as exc:
+            self._failures.append(exc)
+
+
+def run_pipeline(messages: Iterable[InfoMessage],
+                 sink: Optional[TextIO] = None, fmt: str = 'text',
+                 queue_depth: int = 8, batch_size: int = 1024) -> int:
+    """Записать ленивый поток результатов через ``OutputPipeline``.
+
+    ``messages`` - например ``iter_info_messages`` или генератор над
+    ``read_package``, так что расчёт идёт параллельно с записью.
+    """
+    return OutputPipeline(sink, fmt, queue_depth, batch_size).run(messages)
+
+
+RESULT_DTYPE = [('training_type', '|S16'), ('duration', '<f8'),
+                ('distance', '<f8'), ('speed', '<f8'), ('calories', '<f8')]
+_RESULT_RECORD = struct.Struct('<16s4d')
+_NPY_MAGIC = b'\x93NUMPY\x01\x00'
+_NPY_HEADER_SIZE = 256
+
+
+def _npy_header(count: int) -> bytes:
+    """Собрать заголовок ``.npy`` фиксированной длины для ``count`` записей."""
+    header = repr({'descr': RESULT_DTYPE, 'fortran_order': False,
+                   'shape': (count,)}).encode('latin1')
+    size = _NPY_HEADER_SIZE - len(_NPY_MAGIC) - 2
+    if len(header) >= size:
+        raise ValueError("Заголовок .npy не помещается в отведённое место")
+    return (_NPY_MAGIC + struct.pack('<H', size)
+            + header.ljust(size - 1) + b'\n')
+
+
+def _pack_result(training_type: str, duration: float, distance: float,
+                 speed: float, calories: float) -> bytes:
+    """Упаковать один результат тренировки в запись ``RESULT_DTYPE``."""
+    name = training_type.encode('ascii')
+    if len(name) > 16:
+        raise ValueError(f"Слишком длинный тип тренировки: {training_type}")
+    return _RESULT_RECORD.pack(name, duration, distance, speed, calories)
+
+
+class ResultWriter:
+    """Запись результатов тренировок в файл ``.npy`` пачками.
+
+    Файл содержит одномерный структурированный массив ``RESULT_DTYPE``
+    и читается через ``load_results`` или ``numpy.load`` с
+    ``mmap_mode='r'`` без копирования и разбора строк. Записи
+    накапливаются пачками по ``chunk_size``; размер массива
+    в заголовке обновляется при ``flush`` и закрытии. С ``append=True``
+    записи дописываются в конец существующего файла; записи, не
+    учтённые в заголовке (например, после сбоя до ``flush``),
+    отбрасываются.
+    """
+
+    def __init__(self, path: str, append: bool = False,
+                 chunk_size: int = 65536) -> None:
+        self.chunk_size = chunk_size
+        self.count = 0
+        if append and os.path.exists(path) and os.path.getsize(path):
+            self._stream = open(path, 'r+b')
+            self.count = self._read_count()
+            end = _NPY_HEADER_SIZE + self.count * _RESULT_RECORD.size
+            if self._stream.seek(0, os.SEEK_END) < end:
+                self._stream.close()
+                raise ValueError("Файл короче, чем указано в заголовке")
+            self._stream.truncate(end)
+            self._stream.seek(end)
+        else:
+            self._stream = open(path, 'w+b')
+            self._stream.write(_npy_header(0))
+        self._chunk = bytearray()
+        self._pending = 0
+
+    def _read_count(self) -> int:
+        stream = self._stream
+        if stream.read(len(_NPY_MAGIC)) != _NPY_MAGIC:
+            stream.close()
+            raise ValueError("Файл не является .npy версии 1.0")
+        size, = struct.unpack('<H', stream.read(2))
+        header = ast.literal_eval(stream.read(size).decode('latin1'))
+        if (header.get('descr') != RESULT_DTYPE
+                or header.get('fortran_order')
+                or len(header.get('shape', ())) != 1
+                or len(_NPY_MAGIC) + 2 + size != _NPY_HEADER_SIZE):
+            stream.close()
+            raise ValueError("Файл содержит массив другого формата")
+        return header['shape'][0]
+
+    def __enter__(self) -> 'ResultWriter':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def write(self, messages: Iterable[InfoMessage]) -> int:
+        """Добавить результаты тренировок, вернуть их количество."""
+        written = 0
+        for message in messages:
+            self._append(_pack_result(*_result_values(message)))
+            written += 1
+        return written
+
+    def write_columns(self, training_type: str,
+                      columns: Mapping[str, Sequence[float]]) -> int:
+        """Добавить столбцы результатов одного типа тренировки.
+
+        Подходит для вывода ``compute_batch``, дополненного столбцом
+        ``duration``.
+        """
+        written = 0
+        for values in zip(*(columns[name] for name in RESULT_FIELDS[1:])):
+            self._append(_pack_result(training_type, *values))
+            written += 1
+        return written
+
+    def _append(self, record: bytes) -> None:
+        self._chunk += record
+        self._pending += 1
+        if self._pending >= self.chunk_size:
+            self._write_chunk()
+
+    def _write_chunk(self) -> None:
+        self._stream.write(self._chunk)
+        self.count += self._pending
+        self._chunk.clear()
+        self._pending = 0
+
+    def flush(self) -> None:
+        """Записать накопленную пачку и обновить заголовок файла."""
+        self._write_chunk()
+        self._stream.seek(0)
+        self._stream.write(_npy_header(self.count))
+        self._stream.seek(0, os.SEEK_END)
+        self._stream.flush()
+
+    def close(self) -> None:
+        """Завершить запись и закрыть файл."""
+        if not self._stream.closed:
+            self.flush()
+            self._stream.close()
+
+
+def export_results(messages: Iterable[InfoMessage], path: str,
+                   append: bool = False) -> int:
+    """Записать результаты тренировок в файл ``.npy``."""
+    with ResultWriter(path, append=append) as writer:
+        return writer.write(messages)
+
+
+def load_results(path: str) -> 'np.ndarray':
+    """Открыть файл результатов как массив NumPy, отображённый в память."""
+    import numpy as np
+
+    return np.load(path, mmap_mode='r')
+
+
+def to_structured_array(messages: Iterable[InfoMessage]) -> 'np.ndarray':
+    """Собрать результаты тренировок в структурированный массив NumPy."""
+    import numpy as np
+
+    records = bytearray()
+    for message in messages:
+        records += _pack_result(*_result_values(message))
+    return np.frombuffer(records, dtype=RESULT_DTYPE)
+
+
+class PackageServer:
+    """Asyncio-сервер приёма пакетов от датчиков.
+
+    Клиент отправляет пакеты строками JSONL (``["RUN", [9000, 1, 75]]``)
+    и получает по строке ответа на каждый пакет в том же порядке:
+    текст ``get_message()`` или JSON с полями ``InfoMessage``
+    (``reply='json'``). Запросы всех соединений собираются в общую
+    ограниченную очередь и обрабатываются пачками до ``batch_size``;
+    заполненная очередь приостанавливает чтение из сокетов.
+    """
+
+    def __init__(self, reply: str = 'text', batch_size: int = 256,
+                 queue_size: int = 1024) -> None:
+        if reply not in ('text', 'json'):
+            raise ValueError(f"Неизвестный формат ответа: {reply}")
+        self.reply = reply
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self._queue: Optional['asyncio.Queue'] = None
+        self._server: Optional['asyncio.AbstractServer'] = None
+        self._dispatcher: Optional['asyncio.Task'] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0,
+                    path: Optional[str] = None) -> 'asyncio.AbstractServer':
+        """Запустить сервер на TCP-порту или Unix-сокете ``path``."""
+        import asyncio
+
+        self._queue = asyncio.Queue(self.queue_size)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle,
+                                                           path)
+        else:
+            self._server = await asyncio.start_server(self._handle, host,
+                                                      port)
+        return self._server
+
+    async def close(self) -> None:
+        """Остановить приём соединений и обработку очереди."""
+        import asyncio
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+
+    def process(self, line: str) -> str:
+        """Обработать строку пакета и подготовить строку ответа."""
+        try:
+            info = read_package(*parse_package_line(line)
+                                ).show_training_info()
+        except Exception as exc:
+            if self.reply == 'json':
+                return json.dumps({'error': str(exc)}, ensure_ascii=False)
+            return f"ERROR: {exc}".replace('\n', ' ')
+        if self.reply == 'json':
+            reply = asdict(info)
+            del reply['INFO_MESSAGE']
+            reply['message'] = render_message(info)
+            return json.dumps(reply, ensure_ascii=False)
+        return render_message(info)
+
+    async def _dispatch(self) -> None:
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            for line, future in batch:
+                if not future.cancelled():
+                    future.set_result(self.process(line))
+
+    async def _handle(self, reader: 'asyncio.StreamReader',
+                      writer: 'asyncio.StreamWriter') -> None:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        replies: asyncio.Queue = asyncio.Queue(self.batch_size)
+        responder = asyncio.create_task(self._respond(replies, writer))
+        try:
+            async for raw in reader:
+                line = raw.decode('utf-8').strip()
+                if not line:
+                    continue
+                future = loop.create_future()
+                await self._queue.put((line, future))
+                await replies.put(future)
+        finally:
+            await replies.put(None)
+            await responder
+            writer.close()
+            await writer.wait_closed()
+
+    async def _respond(self, replies: 'asyncio.Queue',
+                       writer: 'asyncio.StreamWriter') -> None:
+        while True:
+            future = await replies.get()
+            if future is None:
+                break
+            writer.write((await future).encode('utf-8') + b'\n')
+            if replies.empty():
+                await writer.drain()
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    """Получить перцентиль ``q`` (от 0 до 100) отсортированных значений."""
+    if not values:
+        return 0.0
+    index = max(0, min(len(values) - 1, -int(-q * len(values) // 100) - 1))
+    return values[index]
+
+
+async def run_load(packages: Sequence[Tuple[str, list]],
+                   host: str = '127.0.0.1', port: int = 0,
+                   path: Optional[str] = None, connections: int = 8,
+                   requests: int = 10000) -> Dict[str, float]:
+    """Нагрузить сервер пакетами и измерить пропускную способность.
+
+    Каждое из ``connections`` соединений по очереди отправляет пакеты
+    и ждёт ответа. Возвращает число запросов, ошибок, запросов
+    в секунду и перцентили задержки в миллисекундах.
+    """
+    import asyncio
+
+    lines = [json.dumps([workout_type, list(data)]).encode() + b'\n'
+             for workout_type, data in packages]
+    latencies: List[float] = []
+    errors = 0
+
+    async def client(count: int, offset: int) -> None:
+        nonlocal errors
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        for number in range(count):
+            started = time.perf_counter()
+            writer.write(lines[(offset + number) % len(lines)])
+            reply = await reader.readline()
+            latencies.append(time.perf_counter() - started)
+            if reply.startswith((b'ERROR', b'{"error"')):
+                errors += 1
+        writer.close()
+        await writer.wait_closed()
+
+    shares = [requests // connections + (number < requests % connections)
+              for number in range(connections)]
+    started = time.perf_counter()
+    await asyncio.gather(*(client(count, sum(shares[:number]))
+                           for number, count in enumerate(shares) if count))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': elapsed,
+        'rps': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
     }
 
-    if workout_type not in WORKOUT:
-        raise Exception("Тренировка типа:"
-                        " {workout_type} Неподдерживается.\n"
-                        "Поддерживаемые типы:"
-                        " SWM - Swimming,"
-                        " RUN - Running,"
-                        " WLK - SportsWalking")
 
-    return WORKOUT[workout_type](*data)
+class QuantileSketch:
+    """Сливаемый приближённый подсчёт квантилей (по схеме DDSketch).
+
+    Значения раскладываются по логарифмическим корзинам, поэтому
+    относительная ошибка квантиля не превышает ``relative_accuracy``,
+    а память зависит только от диапазона значений, но не от их числа.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("Точность должна быть в интервале (0, 1)")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._positive: Dict[int, int] = {}
+        self._negative: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        return 2 * self._gamma ** index / (self._gamma + 1)
+
+    def add(self, value: float) -> None:
+        """Учесть значение."""
+        self.count += 1
+        if value > 0:
+            bins = self._positive
+        elif value < 0:
+            bins, value = self._negative, -value
+        else:
+            self.zero_count += 1
+            return
+        index = self._index(value)
+        bins[index] = bins.get(index, 0) + 1
+
+    def merge(self, other: 'QuantileSketch') -> None:
+        """Добавить значения другого подсчёта с той же точностью."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Нельзя объединить подсчёты разной точности")
+        for bins, other_bins in ((self._positive, other._positive),
+                                 (self._negative, other._negative)):
+            for index, count in other_bins.items():
+                bins[index] = bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> float:
+        """Получить приближённый квантиль ``q`` от 0 до 1."""
+        if not 0 <= q <= 1:
+            raise ValueError("Квантиль должен быть от 0 до 1")
+        if not self.count:
+            return math.nan
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self._negative, reverse=True):
+            seen += self._negative[index]
+            if seen > rank:
+                return -self._value(index)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for index in sorted(self._positive):
+            seen += self._positive[index]
+            if seen > rank:
+                return self._value(index)
+        return self._value(max(self._positive))
+
+
+class MetricSummary:
+    """Накопительная сводка по одной метрике тренировок."""
+
+    QUANTILES: ClassVar[Tuple[float, ...]] = (0.5, 0.9, 0.99)
+
+    def __init__(self, relative_accuracy: float = 0.01) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+        self.sketch = QuantileSketch(relative_accuracy)
+
+    def add(self, value: float) -> None:
+        """Учесть значение метрики."""
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        self.sketch.add(value)
+
+    def merge(self, other: 'MetricSummary') -> None:
+        """Добавить значения другой сводки."""
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+        self.sketch.merge(other.sketch)
+
+    def result(self) -> Dict[str, float]:
+        """Получить итоговые значения сводки."""
+        result = {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count if self.count else math.nan,
+            'min': self.minimum,
+            'max': self.maximum,
+        }
+        for q in self.QUANTILES:
+            result[f'p{q * 100:g}'] = self.sketch.quantile(q)
+        return result
+
+
+class WorkoutAggregator:
+    """Потоковые итоги по тренировкам с группировкой.
+
+    Результаты ``show_training_info`` или ``compute_batch`` учитываются
+    по одной записи, память не зависит от их количества. По умолчанию
+    записи группируются по ``training_type``, ``key`` задаёт другую
+    группировку. Частичные итоги параллельных обработчиков
+    объединяются через ``merge``.
+    """
+
+    METRICS: ClassVar[Tuple[str, ...]] = ('duration', 'distance', 'speed',
+                                          'calories')
+
+    def __init__(self, key: Optional[Callable[[InfoMessage], object]] = None,
+                 relative_accuracy: float = 0.01) -> None:
+        self.key = key
+        self.relative_accuracy = relative_accuracy
+        self._groups: Dict[object, Dict[str, MetricSummary]] = {}
+
+    def _group(self, key: object) -> Dict[str, MetricSummary]:
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = {
+                metric: MetricSummary(self.relative_accuracy)
+                for metric in self.METRICS
+            }
+        return group
+
+    def add(self, info: InfoMessage) -> None:
+        """Учесть результат тренировки."""
+        key = info.training_type if self.key is None else self.key(info)
+        group = self._group(key)
+        for metric in self.METRICS:
+            group[metric].add(getattr(info, metric))
+
+    def extend(self, infos: Iterable[InfoMessage]) -> 'WorkoutAggregator':
+        """Учесть поток результатов тренировок."""
+        for info in infos:
+            self.add(info)
+        return self
+
+    def add_batch(self, key: object,
+                  columns: Mapping[str, Sequence[float]]) -> None:
+        """Учесть столбцы результатов, например от ``compute_batch``.
+
+        Все записи попадают в группу ``key``; метрики, которых нет
+        среди столбцов, пропускаются.
+        """
+        group = self._group(key)
+        for metric in self.METRICS:
+            if metric in columns:
+                summary = group[metric]
+                for value in columns[metric]:
+                    summary.add(float(value))
+
+    def merge(self, other: 'WorkoutAggregator') -> 'WorkoutAggregator':
+        """Добавить частичные итоги другого агрегатора."""
+        for key, other_group in other._groups.items():
+            group = self._group(key)
+            for metric, summary in other_group.items():
+                group[metric].merge(summary)
+        return self
+
+    def result(self) -> Dict[object, Dict[str, Dict[str, float]]]:
+        """Получить итоги по группам и метрикам."""
+        return {key: {metric: summary.result()
+                      for metric, summary in group.items() if summary.count}
+                for key, group in self._groups.items()}
+
+
+class Leaderboard:
+    """Индекс лучших результатов тренировок по типам.
+
+    Для каждого ``training_type`` и каждой метрики из ``metrics``
+    хранятся записи ``(значение, номер, InfoMessage)``. Если задан
+    ``k``, записи образуют min-кучу из ``k`` лучших: вставка стоит
+    O(log k), худший результат вытесняется за O(log k). Без ``k``
+    хранится отсортированный список, а новые записи за O(1) копятся
+    в буфере. При запросе буфер до ``INSERT_LIMIT`` записей
+    вставляется в список двоичным поиском, больший буфер сливается
+    с ним сортировкой. При равных значениях выше тот результат, что
+    добавлен раньше. ``len()`` - число разных хранимых результатов.
+    """
+
+    METRICS: ClassVar[Tuple[str, ...]] = ('calories', 'speed', 'distance')
+    INSERT_LIMIT: ClassVar[int] = 64
+
+    def __init__(self, k: Optional[int] = None,
+                 metrics: Sequence[str] = METRICS) -> None:
+        if k is not None and k < 1:
+            raise ValueError("k должно быть положительным")
+        self.k = k
+        self.metrics = tuple(metrics)
+        self._order = 0
+        self._entries: Dict[Tuple[str, str],
+                            List[Tuple[float, int, InfoMessage]]] = {}
+        self._views: Dict[Tuple[str, str],
+                          Tuple[List[float], List[InfoMessage]]] = {}
+        self._pending: Dict[Tuple[str, str],
+                            List[Tuple[float, int, InfoMessage]]] = {}
+
+    def add(self, info: InfoMessage) -> None:
+        """Учесть результат тренировки."""
+        # Номер убывает, чтобы в min-куче раньше выпадали поздние записи.
+        self._order -= 1
+        order = self._order
+        k = self.k
+        for metric in self.metrics:
+            key = (info.training_type, metric)
+            value = getattr(info, metric)
+            if k is None:
+                pending = self._pending.get(key)
+                if pending is None:
+                    pending = self._pending[key] = []
+                pending.append((value, order, info))
+                continue
+            entries = self._entries.get(key)
+            if entries is None:
+                entries = self._entries[key] = []
+            if len(entries) < k:
+                heappush(entries, (value, order, info))
+            elif value > entries[0][0]:
+                heapreplace(entries, (value, order, info))
+            else:
+                continue
+            self._views.pop(key, None)
+
+    def extend(self, infos: Iterable[InfoMessage]) -> 'Leaderboard':
+        """Учесть поток результатов тренировок."""
+        for info in infos:
+            self.add(info)
+        return self
+
+    def _view(self, training_type: str, metric: str
+              ) -> Tuple[List[float], List[InfoMessage]]:
+        if metric not in self.metrics:
+            raise ValueError(f"Метрика {metric} не индексируется")
+        key = (training_type, metric)
+        view = self._views.get(key)
+        pending = self._pending.pop(key, None)
+        if pending and view is not None and len(
+                pending) <= self.INSERT_LIMIT:
+            entries = self._entries[key]
+            values, infos = view
+            for entry in pending:
+                index = bisect_left(entries, entry)
+                entries.insert(index, entry)
+                values.insert(index, entry[0])
+                infos.insert(index, entry[2])
+        elif pending or view is None:
+            entries = self._entries.setdefault(key, [])
+            entries.extend(pending or ())
+            # Отсортированный список остаётся корректной кучей.
+            entries.sort()
+            view = self._views[key] = (
+                [value for value, _, _ in entries],
+                [info for _, _, info in entries])
+        return view
+
+    def top(self, training_type: str, metric: str = 'calories',
+            k: Optional[int] = None) -> List[InfoMessage]:
+        """Получить лучшие результаты по убыванию метрики."""
+        _, infos = self._view(training_type, metric)
+        count = len(infos) if k is None else min(k, len(infos))
+        return infos[len(infos) - count:][::-1]
+
+    def range(self, training_type: str, metric: str = 'calories',
+              low: Optional[float] = None,
+              high: Optional[float] = None) -> List[InfoMessage]:
+        """Получить результаты со значением метрики в ``[low, high]``.
+
+        Результаты возвращаются по возрастанию метрики. Если задан
+        ``k``, поиск идёт только среди сохранённых лучших результатов.
+        """
+        values, infos = self._view(training_type, metric)
+        start = 0 if low is None else bisect_left(values, low)
+        stop = len(values) if high is None else bisect_right(values, high)
+        return infos[start:stop]
+
+    def __len__(self) -> int:
+        if self.k is None:
+            return -self._order
+        return len({order for entries in self._entries.values()
+                    for _, order, _ in entries})
 
 
 def main(training: Training) -> None:
     """Главная функция."""
+    instrumentation = _instrumentation
+    if instrumentation is None:
+        print(training.show_training_info().get_message())
+        return
+    started = time.perf_counter()
     print(training.show_training_info().get_message())
+    instrumentation.observe('main', training.__class__.__name__,
+                            time.perf_counter() - started)
+
+
+DEMO_PACKAGES = [
+    ('SWM', [720, 1, 80, 25, 40]),
+    ('RUN', [9000, 1, 75]),
+    ('WLK', [9000, 1, 75, 180]),
+]
+
+OUTPUT_WRITERS: Dict[str, Callable[..., int]] = {
+    'text': write_report,
+    'jsonl': write_jsonl,
+    'csv': write_csv,
+}
+
+
+def _build_parser() -> 'argparse.ArgumentParser':
+    """Описать аргументы командной строки."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='homework',
+        description='Расчёт результатов тренировок по пакетам датчиков.')
+    parser.add_argument('inputs', nargs='*',
+                        help='файлы пакетов JSONL или CSV, "-" - stdin;'
+                             ' без файлов читается stdin, а если он'
+                             ' терминал - демонстрационные пакеты')
+    parser.add_argument('--input-format', choices=('jsonl', 'csv'),
+                        help='формат входных пакетов (по расширению файла)')
+    parser.add_argument('--format', choices=tuple(OUTPUT_WRITERS),
+                        default='text', help='формат вывода результатов')
+    parser.add_argument('--parallel', action='store_true',
+                        help='считать в пуле процессов')
+    parser.add_argument('--workers', type=int,
+                        help='число процессов (по числу ядер)')
+    parser.add_argument('--chunk-size', type=int, default=10000,
+                        help='размер пачки для пула процессов')
+    parser.add_argument('--queue-depth', type=int,
+                        help='писать вывод в отдельном потоке через очередь'
+                             ' такой глубины')
+    parser.add_argument('--stats', action='store_true',
+                        help='вывести в stderr сводку о скорости обработки')
+    parser.add_argument('--demo', action='store_true',
+                        help='обработать демонстрационные пакеты')
+    return parser
+
+
+def cli(argv: Optional[Sequence[str]] = None) -> int:
+    """Обработать пакеты из файлов или stdin и вывести результаты.
+
+    Без входных файлов при stdin-терминале, как и прежде у
+    ``python homework.py``, выводятся результаты ``DEMO_PACKAGES``.
+    Возвращает код завершения: 1, если во входных данных были ошибки
+    или какой-либо входной файл не удалось прочитать.
+    """
+    args = _build_parser().parse_args(argv)
+    errors = 0
+
+    def on_error(error: PackageLineError) -> None:
+        nonlocal errors
+        errors += 1
+        report_error(error)
+
+    def on_input_error(source: str, error: OSError) -> None:
+        nonlocal errors
+        errors += 1
+        report_input_error(source, error)
+
+    inputs = args.inputs or ['-']
+    started = time.perf_counter()
+    if args.demo or (not args.inputs and sys.stdin.isatty()):
+        infos = (read_package(*package).show_training_info()
+                 for package in DEMO_PACKAGES)
+    elif args.parallel:
+        infos = process_lines_parallel(inputs, args.input_format,
+                                       on_error, args.chunk_size,
+                                       args.workers, on_input_error)
+    else:
+        infos = _iter_inputs(inputs, args.input_format, on_error,
+                             on_input_error)
+    if args.queue_depth:
+        count = run_pipeline(infos, sys.stdout, args.format,
+                             args.queue_depth)
+    else:
+        count = OUTPUT_WRITERS[args.format](infos, sys.stdout)
+    if args.stats:
+        elapsed = time.perf_counter() - started
+        rate = count / elapsed if elapsed else 0.0
+        print(f"Обработано пакетов: {count}, ошибок: {errors},"
+              f" время: {elapsed:.3f} с, {rate:.0f} пакетов/с",
+              file=sys.stderr)
+    return 1 if errors else 0
 
 
 if __name__ == '__main__':
-    packages = [
-        ('SWM', [720, 1, 80, 25, 40]),
-        ('RUN', [9000, 1, 75]),
-        ('WLK', [9000, 1, 75, 180]),
-    ]
-
-    for workout_type, data in packages:
-        training = read_package(workout_type, data)
-        main(training)
+    sys.exit(cli())
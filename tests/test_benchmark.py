@@ -0,0 +1,90 @@
+import json
+import os
+
+import pytest
+
+import benchmark
+import homework
+
+
+@pytest.mark.parametrize('workout_type', ['SWM', 'RUN', 'WLK'])
+def test_generate_packages(workout_type):
+    packages = list(benchmark.generate_packages(workout_type, 50, seed=3))
+    assert packages == list(benchmark.generate_packages(workout_type, 50,
+                                                        seed=3)), (
+        'Генератор пакетов должен быть воспроизводимым.'
+    )
+    for package in packages:
+        assert homework.read_package(*package).show_training_info()
+
+
+def test_run_benchmark_reports_every_stage():
+    results = benchmark.run_benchmark(sizes=[10], workout_types=['RUN'],
+                                      repeat=1)
+    assert [item['stage'] for item in results] == [*benchmark.STAGES,
+                                                   benchmark.TOTAL]
+    assert all(item['ns_per_record'] > 0 for item in results)
+
+
+def test_compare_detects_regression():
+    baseline = [{'workout_type': 'RUN', 'size': 10, 'stage': 'metrics',
+                 'seconds': 1.0, 'ns_per_record': 100.0}]
+    slower = [dict(baseline[0], ns_per_record=130.0)]
+    assert benchmark.compare(baseline, baseline) == []
+    assert len(benchmark.compare(slower, baseline, tolerance=0.25)) == 1
+    assert benchmark.compare(slower, baseline, tolerance=0.5) == []
+
+
+def test_main_fails_on_regression(tmp_path, capsys):
+    baseline = tmp_path / 'baseline.json'
+    output = tmp_path / 'results.json'
+    args = ['--sizes', '20', '--types', 'SWM', '--repeat', '1']
+    assert benchmark.main(args + ['--output', str(baseline)]) == 0
+    results = json.loads(baseline.read_text(encoding='utf-8'))
+    for item in results['results']:
+        item['ns_per_record'] /= 1000
+    baseline.write_text(json.dumps(results), encoding='utf-8')
+    assert benchmark.main(args + ['--output', str(output),
+                                  '--baseline', str(baseline)]) == 1
+    assert 'Замедление' in capsys.readouterr().err
+
+
+def test_compare_calls_detects_extra_calls():
+    baseline = {'RUN': {'read_package': 5.0}}
+    assert benchmark.compare_calls({'RUN': {'read_package': 5.4}},
+                                   baseline) == []
+    assert len(benchmark.compare_calls({'RUN': {'read_package': 7.0}},
+                                       baseline)) == 1
+
+
+with open(os.path.join(os.path.dirname(__file__), os.pardir,
+                       'benchmark_baseline.json'),
+          encoding='utf-8') as baseline_file:
+    BASELINE = json.load(baseline_file)
+
+
+@pytest.mark.parametrize('workout_type', sorted(BASELINE['calls']))
+def test_call_budget(workout_type):
+    calls = {workout_type: benchmark.profile_calls(workout_type)}
+    assert benchmark.compare_calls(calls, BASELINE['calls']) == [], (
+        'Этапу обработки пакета нужно больше вызовов на запись, чем'
+        ' в benchmark_baseline.json.'
+    )
+
+
+with open(os.path.join(os.path.dirname(__file__), 'memory_budget.json'),
+          encoding='utf-8') as budget_file:
+    MEMORY_BUDGET = json.load(budget_file)
+
+
+@pytest.mark.parametrize('workout_type', sorted(MEMORY_BUDGET))
+def test_memory_budget(workout_type):
+    profile = benchmark.profile_memory(workout_type, 2000)
+    assert list(profile) == list(benchmark.RECORD_STAGES)
+    for stage, budget in MEMORY_BUDGET[workout_type].items():
+        for metric, limit in budget.items():
+            assert 0 < profile[stage][metric] <= limit, (
+                f'{workout_type}/{stage}: {metric} на запись '
+                f'{profile[stage][metric]:.1f} превышает бюджет {limit}. '
+                'Проверьте изменения или обновите tests/memory_budget.json.'
+            )
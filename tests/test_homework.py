@@ -1,4 +1,10 @@
+import asyncio
+import dataclasses
+import io
+import json
+import random
 import re
+import sys
 import pytest
 import types
 import inspect
@@ -363,3 +369,972 @@ def test_main_output(input_data, expected):
     assert get_message_output == expected, (
         'Метод `main` должен печатать результат в консоль.\n'
     )
+
+
+def make_packages(workout_type, count, seed=0):
+    rnd = random.Random(seed)
+    packages = []
+    for _ in range(count):
+        data = [rnd.randint(0, 20000), rnd.uniform(0.1, 5),
+                rnd.uniform(40, 120)]
+        if workout_type == 'WLK':
+            data.append(rnd.uniform(140, 210))
+        if workout_type == 'SWM':
+            data.extend([rnd.choice([25, 50]), rnd.randint(0, 80)])
+        packages.append(data)
+    return packages
+
+
+@pytest.mark.parametrize('workout_type', ['SWM', 'RUN', 'WLK'])
+def test_compute_batch(workout_type):
+    np = pytest.importorskip('numpy')
+    packages = make_packages(workout_type, 500)
+    names = [field.name for field
+             in dataclasses.fields(homework.WORKOUT[workout_type])]
+    columns = {name: np.array([data[i] for data in packages])
+               for i, name in enumerate(names)}
+    result = homework.compute_batch(workout_type, columns)
+    for i, data in enumerate(packages):
+        training = homework.read_package(workout_type, data)
+        assert result['distance'][i] == training.get_distance()
+        assert result['speed'][i] == training.get_mean_speed()
+        assert result['calories'][i] == training.get_spent_calories(), (
+            'Пакетный расчёт должен совпадать с расчётом по одному объекту.'
+        )
+
+
+@pytest.mark.parametrize('workout_type, data', [
+    ('WLK', [15652, 1, 75, 103.50620644000004]),
+])
+def test_compute_batch_power_rounding(workout_type, data):
+    np = pytest.importorskip('numpy')
+    names = [field.name for field
+             in dataclasses.fields(homework.WORKOUT[workout_type])]
+    columns = {name: np.array([value]) for name, value in zip(names, data)}
+    result = homework.compute_batch(workout_type, columns)
+    info = homework.read_package(workout_type, data).show_training_info()
+    assert result['calories'][0] == info.calories, (
+        'Степень в пакетном расчёте должна округляться как у `float`.'
+    )
+
+
+def test_compute_batch_missing_column():
+    pytest.importorskip('numpy')
+    with pytest.raises(ValueError):
+        homework.compute_batch('RUN', {'action': [1], 'duration': [1]})
+
+
+def batch_columns(np, workout_type, count):
+    packages = make_packages(workout_type, count)
+    names = [field.name for field
+             in dataclasses.fields(homework.WORKOUT[workout_type])]
+    return {name: np.array([data[i] for data in packages])
+            for i, name in enumerate(names)}
+
+
+@pytest.mark.parametrize('workout_type', ['SWM', 'RUN', 'WLK'])
+def test_compute_batch_float32_error_bounds(workout_type):
+    np = pytest.importorskip('numpy')
+    eps = float(np.finfo(np.float32).eps)
+    columns = batch_columns(np, workout_type, 2000)
+    reference = homework.compute_batch(workout_type, columns)
+    result = homework.compute_batch(workout_type, columns, 'float32')
+    assert all(values.dtype == np.float32 for values in result.values())
+    error = {metric: np.abs(result[metric].astype(np.float64) - values)
+             for metric, values in reference.items()}
+    training_class = homework.WORKOUT[workout_type]
+    weight = columns['weight']
+    duration = columns['duration']
+    speed = reference['speed']
+    # Дистанция и скорость: несколько округлений до float32.
+    assert np.all(error['distance'] <= 2 * eps * reference['distance'])
+    assert np.all(error['speed'] <= 4 * eps * speed)
+    if workout_type == 'RUN':
+        # Вычитание усиливает ошибку, когда 18 * speed близко к 1.79.
+        bound = (4 * eps * (training_class.COEFF_RUNNING_FACTOR * speed
+                            + training_class.COEFF_RUNNING_SUBTR)
+                 * weight / training_class.M_IN_KM * duration
+                 * training_class.M_IN_H)
+    elif workout_type == 'WLK':
+        # Целая часть speed**2 // height может сдвинуться на единицу.
+        bound = (4 * eps * np.abs(reference['calories'])
+                 + training_class.COEFF_WALKING_2 * weight * duration
+                 * training_class.M_IN_H)
+    else:
+        bound = 4 * eps * reference['calories']
+    assert np.all(error['calories'] <= bound), (
+        'Отклонение калорий в float32 превышает оценку формулы.'
+    )
+    deviation = homework.batch_deviation(workout_type, columns)
+    for metric, values in error.items():
+        assert deviation[metric]['absolute'] == values.max(), (
+            '`batch_deviation` должен сообщать наибольшее отклонение.'
+        )
+
+
+def test_compute_batch_dtype():
+    np = pytest.importorskip('numpy')
+    columns = batch_columns(np, 'RUN', 10)
+    assert homework.batch_deviation('RUN', columns, 'float64') == {
+        metric: {'absolute': 0.0, 'relative': 0.0}
+        for metric in ('distance', 'speed', 'calories')
+    }
+    with pytest.raises(ValueError):
+        homework.compute_batch('RUN', columns, 'float16')
+    batch = homework.TrainingBatch(mixed_packages(30))
+    for workout_type, result in batch.compute('float32').items():
+        assert result['calories'].dtype == np.float32
+
+
+def test_iter_packages_formats(tmp_path):
+    jsonl = tmp_path / 'packages.jsonl'
+    jsonl.write_text('["SWM", [720, 1, 80, 25, 40]]\n'
+                     '\n'
+                     '{"workout_type": "RUN", "data": [1206, 12, 6]}\n',
+                     encoding='utf-8')
+    csv = tmp_path / 'packages.csv'
+    csv.write_text('WLK, 9000, 1, 75, 180\n', encoding='utf-8')
+    assert list(homework.iter_packages(str(jsonl))) == [
+        ('SWM', [720, 1, 80, 25, 40]),
+        ('RUN', [1206, 12, 6]),
+    ]
+    assert list(homework.iter_packages(str(csv))) == [
+        ('WLK', [9000.0, 1.0, 75.0, 180.0]),
+    ]
+
+
+def test_iter_info_messages_reports_bad_lines():
+    stream = io.StringIO('["RUN", [9000, 1, 75]]\n'
+                         'not json\n'
+                         '["XXX", [1, 2, 3]]\n'
+                         '["WLK", [9000, 1]]\n'
+                         '["SWM", [720, 0, 80, 25, 40]]\n'
+                         '["WLK", [9000, 1, 75, 180]]\n')
+    errors = []
+    messages = list(homework.iter_info_messages(stream,
+                                                on_error=errors.append))
+    assert [info.training_type for info in messages] == [
+        'Running', 'SportsWalking'
+    ]
+    assert [error.lineno for error in errors] == [2, 3, 4, 5], (
+        'Ошибочные строки должны сообщаться с номерами строк.'
+    )
+    assert errors[1].line == '["XXX", [1, 2, 3]]'
+
+
+def test_iter_trainings_is_lazy():
+    lines = iter(['["RUN", [9000, 1, 75]]\n', 'not json\n'])
+    trainings = homework.iter_trainings(lines, on_error=pytest.fail)
+    assert isinstance(next(trainings), homework.Running)
+    assert next(lines) == 'not json\n', (
+        'Поток пакетов должен читаться лениво.'
+    )
+
+
+def test_write_report_matches_get_message():
+    messages = [
+        homework.read_package(workout_type, data).show_training_info()
+        for workout_type in ('SWM', 'RUN', 'WLK')
+        for data in make_packages(workout_type, 50)
+    ]
+    messages.append(homework.InfoMessage('Running', 1, 2, 3, 4,
+                                         INFO_MESSAGE='{training_type} 100%'))
+    with Capturing() as expected:
+        for message in messages:
+            print(message.get_message())
+    sink = io.StringIO()
+    assert homework.write_report(messages, sink, batch_size=7) == 151
+    assert sink.getvalue().splitlines() == expected, (
+        'Пакетный вывод должен совпадать с `get_message`.'
+    )
+
+
+@pytest.mark.parametrize('template', [
+    'Тип: {training_type}; {calories:.3f} ккал, 100%',
+    'Только текст',
+    '{duration}',
+])
+def test_compile_message_template(template):
+    message = homework.InfoMessage('Swimming', 1.5, 0.994, 1.0, 336.0)
+    formatter = homework.compile_message_template(template)
+    assert formatter(message) == template.format_map(vars(message))
+
+
+def test_compile_message_template_unsupported():
+    assert homework.compile_message_template('{calories:>10}') is None
+
+
+def test_training_metrics_follow_mutation():
+    running = homework.Running(9000, 1, 75)
+    info = running.show_training_info()
+    assert running.get_metrics() == (info.distance, info.speed,
+                                     info.calories)
+    running.action = 15000
+    assert running.get_metrics() == homework.Running(
+        15000, 1, 75).get_metrics(), (
+        'Метрики должны пересчитываться после изменения полей.'
+    )
+    assert '_metrics' not in vars(running)
+
+
+def test_training_equality_after_metrics():
+    swimming = homework.Swimming(720, 1, 80, 25, 40)
+    swimming.get_metrics()
+    assert swimming == homework.Swimming(720, 1, 80, 25, 40)
+
+
+def mixed_packages(count):
+    return [(workout_type, data)
+            for workout_type in ('SWM', 'RUN', 'WLK')
+            for data in make_packages(workout_type, count)]
+
+
+def test_training_batch_views():
+    packages = mixed_packages(20)
+    random.Random(1).shuffle(packages)
+    batch = homework.TrainingBatch(packages)
+    assert len(batch) == len(packages)
+    for training, (workout_type, data) in zip(batch, packages):
+        assert training == homework.read_package(workout_type, data), (
+            '`TrainingBatch` должен возвращать тренировки в исходном порядке.'
+        )
+    assert batch[-1] == homework.read_package(*packages[-1])
+    with pytest.raises(TypeError):
+        batch.append('RUN', [1, 2])
+    assert len(batch) == len(packages)
+
+
+def test_training_batch_compute():
+    pytest.importorskip('numpy')
+    batch = homework.TrainingBatch([('RUN', [9000, 1, 75]),
+                                    ('WLK', [9000, 1, 75, 180])])
+    result = batch.compute()
+    assert set(result) == {'RUN', 'WLK'}
+    assert list(result['RUN']['calories']) == [383.85]
+
+
+def test_training_batch_memory():
+    packages = mixed_packages(3000)
+    batch = homework.TrainingBatch(packages)
+    trainings = [homework.read_package(*package) for package in packages]
+    objects_size = sys.getsizeof(trainings) + sum(
+        sys.getsizeof(training) + sys.getsizeof(vars(training))
+        + sum(map(sys.getsizeof, vars(training).values()))
+        for training in trainings
+    )
+    assert objects_size >= 5 * batch.nbytes, (
+        '`TrainingBatch` должен занимать минимум в 5 раз меньше памяти.'
+    )
+
+
+def test_process_parallel_keeps_order():
+    packages = mixed_packages(30)
+    random.Random(2).shuffle(packages)
+    expected = [homework.read_package(*package).show_training_info()
+                for package in packages]
+    result = homework.process_parallel(iter(packages), chunk_size=7,
+                                       workers=2)
+    assert list(result) == expected, (
+        'Параллельная обработка должна сохранять порядок пакетов.'
+    )
+
+
+@pytest.mark.parametrize('fmt', ['jsonl', 'csv'])
+def test_process_lines_parallel_matches_serial(fmt):
+    packages = mixed_packages(10)
+    if fmt == 'csv':
+        lines = [','.join(map(str, [workout_type, *data]))
+                 for workout_type, data in packages]
+        lines[3] = 'RUN,9000,0,75'
+    else:
+        lines = [json.dumps(package) for package in packages]
+        lines[3] = '["RUN", [9000, 0, 75]]'
+    lines[5] = 'XXX'
+    lines.insert(8, '')
+    text = '\n'.join(lines) + '\n'
+    serial_errors, parallel_errors = [], []
+    expected = list(homework.iter_info_messages(
+        io.StringIO(text), fmt, serial_errors.append))
+    result = homework.process_lines_parallel(
+        [io.StringIO(text)], fmt, parallel_errors.append, chunk_size=4,
+        workers=2)
+    assert list(result) == expected, (
+        'Параллельный расчёт строк должен совпадать с последовательным.'
+    )
+    assert [str(error) for error in parallel_errors] == [
+        str(error) for error in serial_errors]
+    assert [error.lineno for error in parallel_errors] == [4, 6]
+
+
+def test_process_parallel_chunk_size():
+    with pytest.raises(ValueError):
+        list(homework.process_parallel([], chunk_size=0))
+
+
+@pytest.mark.parametrize('reply', ['text', 'json'])
+def test_package_server(reply, tmp_path):
+    packages = [('SWM', [720, 1, 80, 25, 40]), ('RUN', [1206, 12, 6]),
+                ('XXX', [1])]
+
+    async def scenario():
+        server = homework.PackageServer(reply=reply, batch_size=4,
+                                        queue_size=2)
+        await server.start(path=str(tmp_path / 'sensors.sock'))
+        reader, writer = await asyncio.open_unix_connection(
+            str(tmp_path / 'sensors.sock'))
+        for workout_type, data in packages:
+            writer.write(json.dumps([workout_type, data]).encode() + b'\n')
+        replies = [(await reader.readline()).decode().rstrip('\n')
+                   for _ in packages]
+        writer.close()
+        await server.close()
+        return replies
+
+    replies = asyncio.run(scenario())
+    expected = [homework.read_package(*package).show_training_info()
+                for package in packages[:2]]
+    if reply == 'json':
+        decoded = [json.loads(line) for line in replies]
+        assert decoded[0]['message'] == expected[0].get_message()
+        assert decoded[1]['calories'] == expected[1].calories
+        assert 'error' in decoded[2]
+    else:
+        assert replies[:2] == [info.get_message() for info in expected], (
+            'Сервер должен отвечать текстом `get_message` в порядке пакетов.'
+        )
+        assert replies[2].startswith('ERROR: ')
+
+
+def test_run_load():
+    async def scenario():
+        server = homework.PackageServer()
+        tcp = await server.start()
+        port = tcp.sockets[0].getsockname()[1]
+        stats = await homework.run_load(mixed_packages(2), port=port,
+                                        connections=3, requests=50)
+        await server.close()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats['requests'] == 50
+    assert stats['errors'] == 0
+    assert stats['p99_ms'] >= stats['p50_ms'] > 0
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert homework.percentile(values, 50) == 50
+    assert homework.percentile(values, 99) == 99
+    assert homework.percentile(values, 100) == 100
+    assert homework.percentile([], 99) == 0.0
+
+
+def test_packed_roundtrip(tmp_path):
+    path = str(tmp_path / 'packages.bin')
+    packages = mixed_packages(10)
+    assert homework.write_packed(path, packages[:12], chunk_size=5) == 12
+    assert homework.write_packed(path, packages[12:], append=True) == 18
+    with homework.PackedReader(path) as reader:
+        assert len(reader) == len(packages)
+        assert list(reader) == [(workout_type, [float(x) for x in data])
+                                for workout_type, data in packages]
+        trainings = list(reader.trainings())
+    assert [training.show_training_info() for training in trainings] == [
+        homework.read_package(*package).show_training_info()
+        for package in packages
+    ], 'Двоичный формат должен давать те же результаты, что и пакеты.'
+
+
+def test_packed_reader_big_endian(tmp_path, monkeypatch):
+    path = str(tmp_path / 'packages.bin')
+    packages = mixed_packages(3)
+    homework.write_packed(path, packages)
+    with homework.PackedReader(path) as reader:
+        expected = list(reader)
+    monkeypatch.setattr(sys, 'byteorder', 'big')
+    with homework.PackedReader(path) as reader:
+        assert len(reader) == len(packages)
+        assert list(reader) == expected, (
+            'На big-endian платформе записи должны распаковываться.'
+        )
+
+
+def test_write_packed_rejects_wide_workout(tmp_path):
+    @dataclasses.dataclass
+    class Triathlon(homework.Swimming):
+        distance_bike: float = 0
+
+    homework.register_workout('TRI', Triathlon)
+    try:
+        with pytest.raises(ValueError, match='вмещает 5'):
+            homework.write_packed(str(tmp_path / 'packages.bin'),
+                                  [('TRI', [1, 1, 75, 25, 40, 20])])
+    finally:
+        del homework.WORKOUT['TRI'], homework.WORKOUT_SPECS['TRI']
+
+
+def test_write_packed_rejects_long_code(tmp_path):
+    homework.register_workout('INTERVALS', homework.Running)
+    try:
+        with pytest.raises(ValueError, match='8 байт'):
+            homework.write_packed(str(tmp_path / 'packages.bin'),
+                                  [('INTERVALS', [9000, 1, 75])])
+    finally:
+        del homework.WORKOUT['INTERVALS'], homework.WORKOUT_SPECS['INTERVALS']
+
+
+@pytest.mark.parametrize('byteorder', ['little', 'big'])
+def test_packed_reader_rejects_unknown_code(byteorder, tmp_path,
+                                            monkeypatch):
+    path = tmp_path / 'packages.bin'
+    homework.write_packed(str(path), [('RUN', [9000, 1, 75])] * 3)
+    raw = bytearray(path.read_bytes())
+    start = len(homework.PACKED_MAGIC) + homework._PACKED_RECORD.size
+    raw[start:start + 8] = b'XXX'.ljust(8, b'\0')
+    path.write_bytes(bytes(raw))
+    monkeypatch.setattr(sys, 'byteorder', byteorder)
+    with homework.PackedReader(str(path)) as reader:
+        with pytest.raises(ValueError, match="Запись 1: .*'XXX'"):
+            list(reader)
+
+
+def test_packed_reader_rejects_foreign_file(tmp_path):
+    path = tmp_path / 'packages.bin'
+    path.write_bytes(b'not a packed file')
+    with pytest.raises(ValueError):
+        homework.PackedReader(str(path))
+
+
+def test_packed_numpy_views(tmp_path):
+    np = pytest.importorskip('numpy')
+    runs = str(tmp_path / 'runs.bin')
+    homework.write_packed(runs, [('RUN', data)
+                                 for data in make_packages('RUN', 20)])
+    reader = homework.PackedReader(runs)
+    columns = reader.columns('RUN')
+    assert np.shares_memory(columns['weight'], reader.records()), (
+        'Столбцы файла одного типа должны читаться без копирования.'
+    )
+    expected = homework.compute_batch('RUN', columns)
+    assert list(reader.compute('RUN')['calories']) == [
+        homework.read_package('RUN', data).get_spent_calories()
+        for _, data in reader
+    ] == list(expected['calories'])
+    del columns
+    reader.close()
+
+    mixed = str(tmp_path / 'mixed.bin')
+    packages = mixed_packages(5)
+    homework.write_packed(mixed, packages)
+    with homework.PackedReader(mixed) as reader:
+        speeds = list(reader.compute('SWM')['speed'])
+    assert speeds == [homework.read_package(*package).get_mean_speed()
+                      for package in packages if package[0] == 'SWM']
+
+
+def test_instrumentation():
+    instrumentation = homework.enable_instrumentation()
+    try:
+        with Capturing():
+            for workout_type, data in mixed_packages(2):
+                homework.main(homework.read_package(workout_type, data))
+        with pytest.raises(Exception):
+            homework.read_package('XXX', [1, 2, 3])
+    finally:
+        assert homework.disable_instrumentation() is instrumentation
+    snapshot = instrumentation.snapshot()
+    assert set(snapshot['stages']) == {'read_package', 'show_training_info',
+                                       'main'}
+    running = snapshot['stages']['read_package']['Running']
+    assert running['count'] == 2
+    assert sum(running['buckets'].values()) == 2
+    assert snapshot['rejected'] == {'XXX': 1}
+
+    text = instrumentation.to_prometheus()
+    assert ('homework_stage_seconds_count{stage="main",'
+            'training_type="Swimming"} 2') in text
+    assert ('homework_stage_seconds_bucket{stage="main",'
+            'training_type="Swimming",le="+Inf"} 2') in text
+    assert 'homework_rejected_packages_total{workout_type="XXX"} 1' in text
+
+
+def test_instrumentation_disabled_by_default():
+    homework.read_package('RUN', [9000, 1, 75])
+    assert homework.disable_instrumentation() is None
+
+
+def test_read_package_errors():
+    with pytest.raises(homework.UnsupportedWorkoutError) as error:
+        homework.read_package('XXX', [1, 2, 3])
+    assert error.value.package == ('XXX', [1, 2, 3])
+    assert 'SWM - Swimming' in str(error.value)
+    for data in ([9000, 1], [9000, 1, 75, 180], [9000, '1', 75],
+                 [9000, True, 75]):
+        with pytest.raises(homework.MalformedPackageError) as error:
+            homework.read_package('RUN', data)
+        assert error.value.package == ('RUN', data), (
+            'Ошибка должна содержать пакет с неверными данными.'
+        )
+    assert isinstance(error.value, TypeError)
+
+
+def test_read_package_accepts_real_numbers():
+    np = pytest.importorskip('numpy')
+    training = homework.read_package('RUN', [np.float64(9000), 1, 75])
+    assert training.get_spent_calories() == 383.85
+
+
+def test_register_workout():
+    @dataclasses.dataclass
+    class Rowing(homework.Running):
+        LEN_STEP = 5.0
+
+    spec = homework.register_workout('ROW', Rowing)
+    try:
+        assert spec.arity == 3
+        assert spec.fields == ('action', 'duration', 'weight')
+        training = homework.read_package('ROW', [100, 1, 75])
+        assert training == Rowing(100, 1, 75)
+        assert training.get_distance() == 0.5
+    finally:
+        del homework.WORKOUT['ROW'], homework.WORKOUT_SPECS['ROW']
+
+
+def test_quantile_sketch_accuracy():
+    rnd = random.Random(5)
+    values = [rnd.uniform(-50, 500) for _ in range(5000)] + [0.0] * 10
+    sketch = homework.QuantileSketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(value)
+    values.sort()
+    for q in (0, 0.01, 0.25, 0.5, 0.9, 0.99, 1):
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(sketch.quantile(q) - exact) <= 0.01 * abs(exact), (
+            'Квантиль должен считаться с заданной относительной точностью.'
+        )
+
+
+def test_workout_aggregator_merge():
+    packages = mixed_packages(200)
+    infos = [homework.read_package(*package).show_training_info()
+             for package in packages]
+    whole = homework.WorkoutAggregator().extend(infos)
+    first = homework.WorkoutAggregator().extend(infos[::2])
+    second = homework.WorkoutAggregator().extend(infos[1::2])
+    merged = first.merge(second).result()
+    assert merged.keys() == whole.result().keys()
+    for key, group in whole.result().items():
+        for metric, summary in group.items():
+            assert merged[key][metric] == pytest.approx(summary), (
+                'Объединение частичных итогов должно давать общий итог.'
+            )
+    running = whole.result()['Running']
+    calories = [info.calories for info in infos
+                if info.training_type == 'Running']
+    assert running['calories']['count'] == 200
+    assert running['calories']['total'] == pytest.approx(sum(calories))
+    assert running['calories']['max'] == max(calories)
+    assert running['speed']['p50'] == pytest.approx(
+        sorted(info.speed for info in infos
+               if info.training_type == 'Running')[99], rel=0.01)
+
+
+def test_workout_aggregator_custom_key_and_batch():
+    aggregator = homework.WorkoutAggregator(
+        key=lambda info: info.duration > 2)
+    aggregator.add(homework.InfoMessage('Running', 3, 10, 3.3, 500))
+    aggregator.add(homework.InfoMessage('Swimming', 1, 1, 1, 100))
+    aggregator.add_batch(True, {'calories': [100.0, 300.0]})
+    result = aggregator.result()
+    assert result[True]['calories']['mean'] == 300
+    assert 'distance' in result[True]
+    assert result[False]['calories']['count'] == 1
+
+
+@pytest.mark.parametrize('workout_type', ['SWM', 'RUN', 'WLK'])
+def test_live_session_matches_final_package(workout_type):
+    data = make_packages(workout_type, 1, seed=7)[0]
+    start = list(data)
+    start[0], start[1] = 0, 0
+    if workout_type == 'SWM':
+        start[4] = 0
+    session = homework.LiveSession(workout_type, start)
+    assert (session.distance, session.speed, session.calories) == (
+        0.0, 0.0, 0.0)
+    for tick in range(1, 11):
+        pools = data[4] * tick // 10 if workout_type == 'SWM' else None
+        session.update(data[1] * tick / 10, action=data[0] * tick // 10,
+                       count_pool=pools)
+    session.update(data[1], action=data[0],
+                   count_pool=data[4] if workout_type == 'SWM' else None)
+    expected = homework.read_package(workout_type, data).show_training_info()
+    assert session.show_training_info() == expected, (
+        'Итог живой сессии должен совпадать с `show_training_info`.'
+    )
+
+
+@pytest.mark.parametrize('workout_type, data', [
+    ('RUN', [9000, 0, 75]),
+    ('SWM', [720, 0, 80, 25, 40]),
+    ('WLK', [9000, 0, 75, 180]),
+])
+def test_live_session_zero_duration(workout_type, data):
+    session = homework.LiveSession(workout_type, data)
+    distance = homework.read_package(workout_type, data).get_distance()
+    assert session.update(0) == (distance, 0.0, 0.0), (
+        'При нулевой длительности скорость и калории должны быть нулевыми.'
+    )
+    info = session.show_training_info()
+    assert (info.duration, info.distance) == (0, distance)
+
+
+def test_live_session_rejects_pools_for_running():
+    session = homework.LiveSession('RUN', [0, 0.1, 75])
+    assert session.update(1, action=9000) == (5.85, 5.85, 383.85)
+    with pytest.raises(TypeError):
+        session.update(1, count_pool=3)
+
+
+def test_package_cache_hits_and_evictions():
+    cache = homework.PackageCache(maxsize=2)
+    first = cache.info('RUN', [9000, 1, 75])
+    assert cache.info('RUN', (9000.0, 1.0, 75.0)) is first, (
+        'Повторный пакет должен возвращаться из кэша без пересчёта.'
+    )
+    assert cache.message('RUN', [9000, 1, 75]) == first.get_message()
+    cache.info('SWM', [720, 1, 80, 25, 40])
+    cache.info('WLK', [9000, 1, 75, 180])
+    assert cache.stats() == {'size': 2, 'maxsize': 2, 'hits': 2,
+                             'misses': 3, 'evictions': 1,
+                             'expirations': 0}
+    assert cache.info('RUN', [9000, 1, 75]) is not first
+    with pytest.raises(homework.UnsupportedWorkoutError):
+        cache.info('XXX', [1])
+    assert len(cache) == 2
+
+
+def test_package_cache_rejects_bool_values():
+    cache = homework.PackageCache()
+    cache.info('RUN', [9000, 1, 75])
+    with pytest.raises(homework.MalformedPackageError):
+        cache.info('RUN', [9000, True, 75])
+    assert cache.stats()['hits'] == 0, (
+        'Пакет, который отклоняет read_package, не должен браться из кэша.'
+    )
+
+
+def test_package_cache_ttl():
+    now = [0.0]
+    cache = homework.PackageCache(ttl=10, clock=lambda: now[0])
+    first = cache.info('RUN', [9000, 1, 75])
+    now[0] = 9.5
+    assert cache.info('RUN', [9000, 1, 75]) is first
+    now[0] = 10.5
+    assert cache.info('RUN', [9000, 1, 75]) is not first
+    assert cache.stats()['expirations'] == 1
+    assert cache.stats()['misses'] == 2
+
+
+@pytest.mark.parametrize('workout_type', ['SWM', 'RUN', 'WLK'])
+def test_kernels_match_methods(workout_type):
+    training_class = homework.WORKOUT[workout_type]
+    kernel, arguments = homework.compile_kernel(training_class)
+    assert kernel is not None
+    for data in make_packages(workout_type, 1000, seed=11):
+        training = training_class(*data)
+        assert kernel(*data) == (training.get_distance(),
+                                 training.get_mean_speed(),
+                                 training.get_spent_calories()), (
+            'Расчётное ядро должно совпадать с методами класса.'
+        )
+        assert arguments(training) == tuple(data)
+
+
+def test_kernel_follows_subclass_overrides():
+    @dataclasses.dataclass
+    class LongStepRunning(homework.Running):
+        LEN_STEP = 1.0
+
+    @dataclasses.dataclass
+    class FlatRunning(homework.Running):
+        def get_spent_calories(self):
+            return 1.0
+
+    kernel, _ = homework.compile_kernel(LongStepRunning)
+    assert kernel(1000, 1, 75)[0] == 1.0
+    assert homework.compile_kernel(FlatRunning) == (None, None)
+    assert FlatRunning(9000, 1, 75).get_metrics() == (5.85, 5.85, 1.0)
+
+
+def test_cli_demo(capsys):
+    assert homework.cli(['--demo']) == 0
+    assert capsys.readouterr().out.splitlines() == [
+        homework.read_package(*package).show_training_info().get_message()
+        for package in homework.DEMO_PACKAGES
+    ]
+
+
+class TerminalInput(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_cli_without_inputs(monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'stdin', TerminalInput())
+    assert homework.cli([]) == 0
+    assert len(capsys.readouterr().out.splitlines()) == len(
+        homework.DEMO_PACKAGES), (
+        'Без входных файлов в терминале должны выводиться демо-результаты.'
+    )
+    monkeypatch.setattr(sys, 'stdin', io.StringIO('["RUN", [9000, 1, 75]]\n'))
+    assert homework.cli([]) == 0
+    assert capsys.readouterr().out.startswith('Тип тренировки: Running;')
+
+
+@pytest.mark.parametrize('parallel', [[], ['--parallel', '--workers', '2',
+                                           '--chunk-size', '2']])
+def test_cli_formats(parallel, tmp_path, capsys):
+    source = tmp_path / 'packages.csv'
+    source.write_text('RUN, 9000, 1, 75\n'
+                      'XXX, 1, 2\n'
+                      'WLK, 9000, 1, 75, 180\n'
+                      'RUN, 9000, 0, 75\n'
+                      'SWM, 720, 1, 80, 25, 40\n', encoding='utf-8')
+    assert homework.cli([str(source), '--format', 'jsonl', '--stats']
+                        + parallel) == 1
+    captured = capsys.readouterr()
+    results = [json.loads(line) for line in captured.out.splitlines()]
+    assert [result['training_type'] for result in results] == [
+        'Running', 'SportsWalking', 'Swimming'
+    ]
+    assert results[0]['calories'] == 383.85
+    assert 'Строка 2' in captured.err
+    assert 'Строка 4: float division by zero' in captured.err, (
+        'Ошибки расчёта должны одинаково сообщаться в обоих режимах.'
+    )
+    assert 'Обработано пакетов: 3, ошибок: 2' in captured.err
+
+
+@pytest.mark.parametrize('parallel', [[], ['--parallel', '--workers', '2']])
+def test_cli_missing_input(parallel, tmp_path, capsys):
+    source = tmp_path / 'packages.jsonl'
+    source.write_text('["RUN", [9000, 1, 75]]\n', encoding='utf-8')
+    missing = str(tmp_path / 'missing.jsonl')
+    assert homework.cli([missing, str(source), '--stats'] + parallel) == 1
+    captured = capsys.readouterr()
+    assert captured.out.startswith('Тип тренировки: Running;'), (
+        'Остальные входные файлы должны обрабатываться.'
+    )
+    assert f'Файл {missing}: No such file or directory' in captured.err
+    assert 'Traceback' not in captured.err
+    assert 'Обработано пакетов: 1, ошибок: 1' in captured.err
+
+
+def test_cli_csv_output(tmp_path, capsys):
+    source = tmp_path / 'packages.jsonl'
+    source.write_text('["SWM", [720, 1, 80, 25, 40]]\n', encoding='utf-8')
+    assert homework.cli([str(source), '--format', 'csv']) == 0
+    assert capsys.readouterr().out.splitlines() == [
+        'training_type,duration,distance,speed,calories',
+        'Swimming,1,0.9935999999999999,1.0,336.0',
+    ]
+
+
+def read_result_file(path):
+    raw = path.read_bytes()
+    size = homework._NPY_HEADER_SIZE
+    header = raw[10:size].decode('latin1')
+    records = [homework._RESULT_RECORD.unpack_from(raw, offset)
+               for offset in range(size, len(raw), 48)]
+    return header, records
+
+
+def test_result_writer_chunks_and_append(tmp_path):
+    path = tmp_path / 'results.npy'
+    infos = [homework.read_package(*package).show_training_info()
+             for package in mixed_packages(3)]
+    with homework.ResultWriter(str(path), chunk_size=2) as writer:
+        assert writer.write(infos[:5]) == 5
+    assert homework.export_results(infos[5:], str(path), append=True) == 4
+    header, records = read_result_file(path)
+    assert "'shape': (9,)" in header
+    assert records == [
+        (info.training_type.encode().ljust(16, b'\0'), info.duration,
+         info.distance, info.speed, info.calories) for info in infos
+    ], 'Результаты должны сохраняться в файл без потерь.'
+
+
+def test_result_writer_append_drops_unflushed_records(tmp_path):
+    path = tmp_path / 'results.npy'
+    infos = [homework.read_package(*package).show_training_info()
+             for package in mixed_packages(2)]
+    homework.export_results(infos[:3], str(path))
+    with open(path, 'ab') as stream:
+        stream.write(homework._pack_result('Running', 1, 2, 3, 4))
+        stream.write(b'partial')
+    assert homework.export_results(infos[3:], str(path), append=True) == 3
+    header, records = read_result_file(path)
+    assert "'shape': (6,)" in header
+    assert [record[0].rstrip(b'\0').decode() for record in records] == [
+        info.training_type for info in infos
+    ], 'Записи, не учтённые в заголовке, должны отбрасываться.'
+
+
+def test_result_writer_rejects_truncated_file(tmp_path):
+    path = tmp_path / 'results.npy'
+    infos = [homework.read_package(*package).show_training_info()
+             for package in mixed_packages(1)]
+    homework.export_results(infos, str(path))
+    path.write_bytes(path.read_bytes()[:-1])
+    with pytest.raises(ValueError):
+        homework.ResultWriter(str(path), append=True)
+
+
+def test_result_writer_rejects_foreign_file(tmp_path):
+    path = tmp_path / 'results.npy'
+    path.write_bytes(b'not numpy')
+    with pytest.raises(ValueError):
+        homework.ResultWriter(str(path), append=True)
+
+
+def test_load_results_memory_mapped(tmp_path):
+    np = pytest.importorskip('numpy')
+    path = str(tmp_path / 'results.npy')
+    batch = homework.compute_batch('RUN', {'action': [9000, 1206],
+                                           'duration': [1, 12],
+                                           'weight': [75, 6]})
+    with homework.ResultWriter(path) as writer:
+        writer.write_columns('Running', dict(batch, duration=[1.0, 12.0]))
+    results = homework.load_results(path)
+    assert isinstance(results, np.memmap)
+    assert list(results['calories']) == [383.85, -81.32032799999999]
+    assert results['training_type'][0] == b'Running'
+    info = homework.InfoMessage('Swimming', 1, 0.994, 1.0, 336.0)
+    array = homework.to_structured_array([info, info])
+    assert array.dtype == np.dtype(homework.RESULT_DTYPE)
+    assert list(array['speed']) == [1.0, 1.0]
+    np.save(str(tmp_path / 'saved.npy'), array)
+    assert list(np.load(str(tmp_path / 'saved.npy'))) == list(array)
+
+
+@pytest.mark.parametrize('fmt, writer', [('text', 'write_report'),
+                                         ('jsonl', 'write_jsonl'),
+                                         ('csv', 'write_csv')])
+def test_run_pipeline_matches_writers(fmt, writer):
+    packages = mixed_packages(40)
+    with Capturing() as expected:
+        getattr(homework, writer)(
+            homework.read_package(*package).show_training_info()
+            for package in packages
+        )
+    sink = io.StringIO()
+    count = homework.run_pipeline(
+        (homework.read_package(*package).show_training_info()
+         for package in packages),
+        sink, fmt, queue_depth=2, batch_size=7)
+    assert count == len(packages)
+    assert sink.getvalue().splitlines() == expected, (
+        'Конвейер должен выводить то же, что и прямая запись.'
+    )
+
+
+def test_run_pipeline_propagates_producer_error():
+    sink = io.StringIO()
+
+    def messages():
+        yield homework.read_package('RUN', [9000, 1, 75]).show_training_info()
+        raise RuntimeError('датчик отключён')
+
+    with pytest.raises(RuntimeError, match='датчик отключён'):
+        homework.run_pipeline(messages(), sink, batch_size=1)
+    assert sink.getvalue().count('\n') == 1
+
+
+def test_run_pipeline_propagates_writer_error():
+    class BrokenSink(io.StringIO):
+        def write(self, text):
+            raise OSError('канал закрыт')
+
+    consumed = []
+
+    def messages():
+        for package in mixed_packages(100):
+            consumed.append(package)
+            yield homework.read_package(*package).show_training_info()
+
+    with pytest.raises(OSError, match='канал закрыт'):
+        homework.run_pipeline(messages(), BrokenSink(), queue_depth=1,
+                              batch_size=1)
+    assert len(consumed) < 300, (
+        'Ошибка записи должна останавливать расчёт.'
+    )
+
+
+def test_leaderboard_top_and_range():
+    infos = [homework.read_package(*package).show_training_info()
+             for package in mixed_packages(300)]
+    board = homework.Leaderboard().extend(infos)
+    bounded = homework.Leaderboard(k=5).extend(infos)
+    kept = set()
+    for training_type in ('Swimming', 'Running', 'SportsWalking'):
+        for metric in homework.Leaderboard.METRICS:
+            ranked = sorted((info for info in infos
+                             if info.training_type == training_type),
+                            key=lambda info: getattr(info, metric),
+                            reverse=True)
+            assert board.top(training_type, metric, 10) == ranked[:10], (
+                'Лидеры должны совпадать с полной сортировкой.'
+            )
+            assert bounded.top(training_type, metric) == ranked[:5]
+            kept.update(map(id, ranked[:5]))
+    assert len(board) == len(infos)
+    assert len(bounded) == len(kept), (
+        'len() должен считать разные результаты, а не записи по метрикам.'
+    )
+    fastest = board.range('Swimming', 'speed', low=1.5, high=3)
+    assert fastest == sorted(
+        (info for info in infos
+         if info.training_type == 'Swimming' and 1.5 <= info.speed <= 3),
+        key=lambda info: info.speed)
+    assert board.top('Rowing') == []
+    with pytest.raises(ValueError):
+        board.top('Running', 'duration')
+
+
+def test_leaderboard_interleaved_queries():
+    infos = [homework.read_package(*package).show_training_info()
+             for package in mixed_packages(200)]
+    random.Random(2).shuffle(infos)
+    board = homework.Leaderboard(metrics=('calories',))
+    added = []
+    for batch in (1, 3, homework.Leaderboard.INSERT_LIMIT,
+                  homework.Leaderboard.INSERT_LIMIT + 1, 200):
+        for info in infos[len(added):len(added) + batch]:
+            board.add(info)
+            added.append(info)
+        expected = sorted((info for info in added
+                           if info.training_type == 'Running'),
+                          key=lambda info: info.calories)
+        assert board.range('Running') == expected, (
+            'Запросы между вставками должны видеть все результаты.'
+        )
+    assert len(board) == len(added)
+
+
+@pytest.mark.parametrize('k', [None, 2])
+def test_leaderboard_ties_and_incremental_queries(k):
+    board = homework.Leaderboard(k=k, metrics=('calories',))
+    first = homework.InfoMessage('Running', 1, 1, 1, 10.0)
+    second = homework.InfoMessage('Running', 2, 1, 1, 10.0)
+    board.add(first)
+    assert board.top('Running') == [first]
+    board.add(second)
+    board.add(homework.InfoMessage('Running', 3, 1, 1, 5.0))
+    assert board.top('Running', k=2) == [first, second], (
+        'При равных значениях выше должен быть результат, добавленный раньше.'
+    )
+    best = homework.InfoMessage('Running', 4, 1, 1, 20.0)
+    board.add(best)
+    assert board.top('Running', k=2) == [best, first]
+    assert board.range('Running', low=10, high=10) == (
+        [second, first] if k is None else [first])